@@ -1,17 +1,76 @@
-from langchain.agents import initialize_agent, AgentType
-from output_parser import get_output_parser
+from langchain.agents import AgentExecutor, ConversationalAgent
+from langchain.chains import LLMChain
+from langchain_core.agents import AgentFinish
+from output_parser import get_output_parser, handle_parsing_error
+from prompts import AI_PREFIX
+from config import agent_turn_budget, agent_max_iterations
+
+# What AgentExecutor returns when it stops the loop early with early_stopping_method="force"
+STOPPED_OUTPUT = "Agent stopped due to iteration limit or time limit."
+
+
+def degraded_answer(intermediate_steps):
+    """Best answer that can be built from the tool observations gathered before the agent was cut off."""
+    for action, observation in reversed(intermediate_steps):
+        if isinstance(observation, list) and observation and isinstance(observation[0], dict):
+            lines = [f"- {product['Product']} ({product['Price']}): {product['Description']}" for product in observation]
+            return "Sorry for the wait, here is what I found so far:\n" + "\n".join(lines)
+        if isinstance(observation, str) and observation and action.tool != "_Exception":
+            return observation
+    return "Sorry, this is taking longer than expected. Could you please try again or rephrase your question?"
+
+
+class DeadlineAgentExecutor(AgentExecutor):
+    """
+    Agent executor with a per-turn latency budget.
+    Before each step it estimates the step's duration from the average so far and stops when the step
+    would overrun turn_budget. A turn that is cut off answers from the tool observations gathered so far.
+    Every turn's outputs carry a stop_reason: finished, deadline or max_iterations.
+    """
+    turn_budget: float = 15.0
+
+    def _should_continue(self, iterations, time_elapsed):
+        if not super()._should_continue(iterations, time_elapsed):
+            return False
+        return iterations == 0 or time_elapsed + time_elapsed / iterations <= self.turn_budget
+
+    def _finish(self, output, intermediate_steps):
+        if output.return_values.get("output") != STOPPED_OUTPUT:
+            output.return_values["stop_reason"] = "finished"
+            return output
+        if self.max_iterations is not None and len(intermediate_steps) >= self.max_iterations:
+            stop_reason = "max_iterations"
+        else:
+            stop_reason = "deadline"
+        print(f"Agent turn stopped early ({stop_reason}) after {len(intermediate_steps)} step(s)")
+        return AgentFinish({"output": degraded_answer(intermediate_steps), "stop_reason": stop_reason}, "")
+
+    def _return(self, output, intermediate_steps, run_manager=None):
+        return super()._return(self._finish(output, intermediate_steps), intermediate_steps, run_manager=run_manager)
+
+    async def _areturn(self, output, intermediate_steps, run_manager=None):
+        return await super()._areturn(self._finish(output, intermediate_steps), intermediate_steps,
+                                      run_manager=run_manager)
 
 
 def setup_agent(llm, tools, memory, context_prompt):
-    # Get Pydantic output parser
-    output_parser = get_output_parser()
-    
-    # Initialize the agent 
-    return initialize_agent(
-        llm=llm,
-        agent=AgentType.CONVERSATIONAL_REACT_DESCRIPTION,
+    # Conversational ReAct agent driven by our own prompt
+    agent = ConversationalAgent(
+        llm_chain=LLMChain(llm=llm, prompt=context_prompt),
+        allowed_tools=[tool.name for tool in tools],
+        ai_prefix=AI_PREFIX,
+        output_parser=get_output_parser(),
+    )
+
+    # Initialize the agent executor
+    return DeadlineAgentExecutor.from_agent_and_tools(
+        agent=agent,
         tools=tools,
         memory=memory,
         verbose=True,
-        output_parser=output_parser,  
+        handle_parsing_errors=handle_parsing_error,
+        max_iterations=agent_max_iterations,
+        max_execution_time=agent_turn_budget,
+        early_stopping_method="force",
+        turn_budget=agent_turn_budget,
     )
@@ -0,0 +1,92 @@
+import time
+import threading
+
+
+class Cart:
+    """
+    One session's cart: product ID -> [row in the product table, unit price in cents, quantity],
+    plus a running total in integer cents. Add, remove and membership checks are O(1) and the total
+    is never re-summed.
+    Callers hold cart.lock around operations, so sessions never contend with each other.
+    """
+    __slots__ = ('lines', 'total_cents', 'lock', 'last_used')
+
+    def __init__(self):
+        self.lines = {}
+        self.total_cents = 0
+        self.lock = threading.Lock()
+        self.last_used = time.monotonic()
+
+    def __contains__(self, product_id):
+        return product_id in self.lines
+
+    def __len__(self):
+        return len(self.lines)
+
+    def add(self, product_id, row, price_cents, quantity=1):
+        line = self.lines.get(product_id)
+        if line is None:
+            self.lines[product_id] = [row, price_cents, quantity]
+        else:
+            line[2] += quantity
+        self.total_cents += price_cents * quantity
+
+    def remove(self, product_id, quantity=None):
+        """Remove some or (by default) all of a product. Returns False if it was not in the cart."""
+        line = self.lines.get(product_id)
+        if line is None:
+            return False
+        if quantity is None or quantity >= line[2]:
+            quantity = line[2]
+            del self.lines[product_id]
+        else:
+            line[2] -= quantity
+        self.total_cents -= line[1] * quantity
+        return True
+
+    def items(self):
+        """(row, unit price in cents, quantity) tuples in the order products were first added."""
+        return [tuple(line) for line in self.lines.values()]
+
+
+class CartStore:
+    """
+    Carts keyed by chat session ID.
+    Carts idle for longer than ttl seconds are evicted, so memory stays bounded under many
+    short-lived visitors; the sweep runs as part of normal lookups.
+    """
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self.carts = {}
+        self.lock = threading.Lock()   # Only guards creating and removing carts
+        self.last_sweep = time.monotonic()
+
+    def get(self, session_id):
+        """The cart of a session, created on first use."""
+        now = time.monotonic()
+        if now - self.last_sweep > self.ttl / 4:
+            self.evict_idle(now)
+        cart = self.carts.get(session_id)
+        if cart is None:
+            with self.lock:
+                cart = self.carts.setdefault(session_id, Cart())
+        cart.last_used = now
+        return cart
+
+    def drop(self, session_id):
+        with self.lock:
+            self.carts.pop(session_id, None)
+
+    def evict_idle(self, now=None):
+        now = now or time.monotonic()
+        with self.lock:
+            self.last_sweep = now
+            idle = [session_id for session_id, cart in self.carts.items()
+                    if now - cart.last_used > self.ttl and not cart.lock.locked()]
+            for session_id in idle:
+                del self.carts[session_id]
+        return len(idle)
+
+    def __len__(self):
+        return len(self.carts)
@@ -0,0 +1,133 @@
+import os
+import pickle
+from array import array
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+_catalog_version = 0
+MAX_CENTS = 2 ** 63 - 1   # Largest price the array('q') column can hold
+
+
+def catalog_version():
+    """Counter that changes whenever the product table or the search indexes change."""
+    return _catalog_version
+
+
+def bump_catalog_version():
+    global _catalog_version
+    _catalog_version += 1
+
+
+def parse_price_cents(price):
+    """
+    Parse a price string such as '999', '$1,099.99' into integer cents, rounding half up to the cent.
+    Raises ValueError for anything that is not a finite, non-negative amount that fits the int64
+    price column.
+    """
+    try:
+        amount = Decimal(price.replace('$', '').replace(',', '').strip())
+        if not amount.is_finite() or amount < 0:
+            raise ValueError(f"Invalid price: {price!r}")
+        cents = int((amount * 100).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+    except InvalidOperation:
+        raise ValueError(f"Invalid price: {price!r}")
+    if cents > MAX_CENTS:
+        raise ValueError(f"Price out of range: {price!r}")
+    return cents
+
+
+def format_price(cents):
+    return f"${cents // 100:,}.{cents % 100:02d}"
+
+
+class ProductTable:
+    """
+    Column-oriented product catalog built at ingest time, one row per product ID.
+    Search hits carry the product ID in their metadata and resolve to a row here in O(1),
+    so nothing is re-parsed from page_content on the request path.
+    """
+    __slots__ = ('ids', 'categories', 'names', 'descriptions', 'prices', 'rows')
+
+    def __init__(self):
+        self.ids = []
+        self.categories = []
+        self.names = []
+        self.descriptions = []
+        self.prices = array('q')   # Integer cents
+        self.rows = {}             # product ID -> row
+
+    def __len__(self):
+        return len(self.ids)
+
+    def add(self, product_id, product):
+        """Add a product record if its ID is new. Returns the row of the product."""
+        row = self.rows.get(product_id)
+        if row is not None:
+            return row
+        price = parse_price_cents(product['Price'])
+        row = len(self.ids)
+        self.ids.append(product_id)
+        self.categories.append(product['Category'])
+        self.names.append(product['Product'])
+        self.descriptions.append(product['Description'])
+        self.prices.append(price)
+        self.rows[product_id] = row
+        bump_catalog_version()
+        return row
+
+    def row(self, product_id):
+        """Row of a product ID, or None if the product is not in the catalog."""
+        return self.rows.get(product_id)
+
+    def record(self, row):
+        """Product details of a row in the shape the tools return to the agent."""
+        return {
+            'Category': self.categories[row],
+            'Product': self.names[row],
+            'Price': format_price(self.prices[row]),
+            'Description': self.descriptions[row],
+        }
+
+
+def source_fingerprint(paths):
+    """(path, size, mtime) of every source file, to tell whether a snapshot is still current."""
+    return [(path, os.path.getsize(path), os.path.getmtime(path)) for path in paths]
+
+
+def save_snapshot(product_table, path, sources):
+    """
+    Save the product table together with the fingerprint of the files it was built from.
+    Source paths are stored absolute, so the snapshot stays valid from any working directory.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        pickle.dump({'sources': source_fingerprint([os.path.abspath(source) for source in sources]),
+                     'table': product_table}, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+
+
+def read_snapshot(path):
+    """The snapshot saved at path, as {'sources': fingerprint, 'table': ProductTable}, or None if there is none."""
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'rb') as f:
+            snapshot = pickle.load(f)
+        snapshot['sources'], snapshot['table']
+    except (OSError, pickle.UnpicklingError, EOFError, KeyError, TypeError) as e:
+        print(f"Ignoring unreadable catalog snapshot: {e}")
+        return None
+    return snapshot
+
+
+def snapshot_sources(snapshot):
+    """Source files the snapshot was built from."""
+    return [source for source, _, _ in snapshot['sources']]
+
+
+def snapshot_is_current(snapshot):
+    """Whether none of the snapshot's source files has changed or gone missing since it was taken."""
+    try:
+        return snapshot['sources'] == source_fingerprint(snapshot_sources(snapshot))
+    except OSError:
+        return False
@@ -3,10 +3,64 @@ from dotenv import load_dotenv, find_dotenv
 
 load_dotenv(find_dotenv())
 api_key = os.environ.get("GROQ_API_KEY")
+llm_model = "llama3-groq-70b-8192-tool-use-preview"
+llm_backend = os.environ.get("LLM_BACKEND", "groq")   # 'groq', or 'fake' for the offline model in fake_llm.py
 persist_directory = 'doc/chroma/'
-csv_file = 'products.csv'                 
+vector_backend = os.environ.get("VECTOR_BACKEND", "chroma")   # 'chroma' or 'numpy'
+numpy_index_directory = 'doc/numpy_index/'
+csv_file = 'products.csv'
+
+# Embeddings
+embedding_model_name = 'sentence-transformers/all-MiniLM-L6-v2'
+embedding_cache_directory = 'doc/embedding_cache/'
+embedding_cache_size = 50000              # Max number of vectors kept on disk
+query_cache_size = 10000                  # Max number of query embeddings kept in memory
+warm_query_cache = True                   # Pre-embed category names and top queries at startup
+top_queries_file = 'doc/top_queries.txt'  # Popular queries used to warm the query cache, one per line
+
+# Retrieval result cache
+result_cache_size = 10000                 # Max number of cached search results
+result_cache_ttl = 300                    # Seconds before a cached search result expires
+
+# Agent limits
+agent_turn_budget = 15.0                  # Seconds per turn before the agent answers with what it has
+agent_max_iterations = 5                  # Max ReAct steps per turn
+tool_timeout = 5.0                        # Seconds before a tool call is abandoned
+llm_timeout = 10.0                        # Seconds before a single LLM request times out
+
+# LLM client
+llm_max_connections = 20                  # Pooled HTTP connections to the LLM API per process
+llm_max_concurrent = 8                    # LLM requests in flight at once, the rest queue fairly by session
+llm_token_reserve = 2000                  # Hold new requests when fewer tokens than this remain in the rate-limit window
+llm_max_retries = 5                       # Retries of rate-limited or failed LLM requests, with jittered backoff
+
+# Offline fake LLM (llm_backend = 'fake')
+fake_llm_latency = float(os.environ.get("FAKE_LLM_LATENCY", "0.3"))                    # Seconds before the first token
+fake_llm_tokens_per_second = float(os.environ.get("FAKE_LLM_TOKENS_PER_SECOND", "100"))  # 0 for no token delay
+fake_llm_transcripts = os.environ.get("FAKE_LLM_TRANSCRIPTS", "")   # JSONL transcripts to replay, empty for scripted rules
+record_transcripts = os.environ.get("RECORD_TRANSCRIPTS", "")       # Record the live LLM's agent steps to this JSONL file
+
+# Semantic response cache
+response_cache_threshold = 0.92           # Min cosine similarity to reuse a cached answer
+response_cache_size = 1000                # Max number of cached answers
+
+# Conversation memory
+memory_token_budget = 2000                # Max tokens of chat history sent to the LLM, summary included
+
+# Carts
+cart_idle_ttl = 30 * 60                   # Seconds before an idle session's cart is evicted
+
+# Serving
+serve_port = 5000
+serve_workers = int(os.environ.get("SERVE_WORKERS", "1"))   # Forked server processes, needs the numpy backend
+reindex_on_start = os.environ.get("REINDEX_ON_START", "0") == "1"   # Re-sync against csv_file only, removing all other products
+warm_llm_connection = True                # Send a one-token request at startup to open the LLM connection
+
+# Tracing and metrics
+tracing_enabled = os.environ.get("TRACING", "0") == "1"   # Time every stage of a turn, near zero cost when off
+metrics_port = int(os.environ.get("METRICS_PORT", "9100"))   # Prometheus /metrics endpoint, bound to localhost
+trace_slow_turns = 5.0                    # Print the span trace of turns slower than this many seconds
 
 # Prevent TensorFlow optimizations
 os.environ["TF_ENABLE_ONEDNN_OPTS"] = "0"
 
-
@@ -1,6 +1,28 @@
-from langchain_community.document_loaders import CSVLoader
+import csv
 from config import csv_file
+from catalog import parse_price_cents
 
-def load_data():
-    loader = CSVLoader(file_path=csv_file, encoding='utf-8') 
-    return loader.load()
\ No newline at end of file
+REQUIRED_FIELDS = ['Category', 'Product', 'Price', 'Description']
+
+
+def parse_product(row):
+    """Clean up one CSV row. Returns the product record, or None if a field is missing or the price is invalid."""
+    fields = {key.strip(): (value or '').strip() for key, value in row.items() if key}
+    if not all(fields.get(key) for key in REQUIRED_FIELDS):
+        return None
+    try:
+        parse_price_cents(fields['Price'])
+    except ValueError:
+        return None
+    return fields
+
+
+def load_data(file_path=csv_file):
+    """Lazily yield validated product records from the catalog CSV, one row at a time."""
+    with open(file_path, newline='', encoding='utf-8-sig') as f:
+        for line_number, row in enumerate(csv.DictReader(f), start=2):
+            product = parse_product(row)
+            if product is None:
+                print(f"Skipping malformed row {line_number} in {file_path}")
+                continue
+            yield product
@@ -1,23 +1,43 @@
+import hashlib
 from langchain.schema import Document
 
-def create_documents(data):
-    documents = []
-    for doc in data:
-        try:
-            lines = doc.page_content.split('\n')
-            content_dict = {}
-            for line in lines:
-                if ": " in line:
-                    key, value = line.split(": ", 1)
-                    content_dict[key.strip()] = value.strip()
-            if all(key in content_dict for key in ['Category', 'Product', 'Price', 'Description']):
-                content = (
-                    f"Category: {content_dict['Category']}\n"
-                    f"Product: {content_dict['Product']}\n"
-                    f"Price: {content_dict['Price']}\n"
-                    f"Description: {content_dict['Description']}"
-                )
-                documents.append(Document(page_content=content))
-        except Exception as e:
-            print(f"Skipping malformed document: {e}")
-    return documents
\ No newline at end of file
+
+def product_content(product):
+    """Render a product record as the text that gets embedded."""
+    return (
+        f"Category: {product['Category']}\n"
+        f"Product: {product['Product']}\n"
+        f"Price: {product['Price']}\n"
+        f"Description: {product['Description']}"
+    )
+
+
+def parse_content(content):
+    """Product record back from its embedded text, the inverse of product_content."""
+    product = {}
+    for line in content.split('\n', 3):
+        key, _, value = line.partition(': ')
+        product[key] = value
+    return product
+
+
+def product_id(content):
+    """Stable ID for a product, derived from a hash of its embedded text."""
+    return hashlib.sha1(content.encode('utf-8')).hexdigest()
+
+
+def create_document(content):
+    return Document(page_content=content, metadata={'product_id': product_id(content)})
+
+
+def create_documents(data, product_table=None):
+    """
+    Lazily turn product records into Documents.
+    If a product table is given, every record is also added to it under its product ID.
+    """
+    for product in data:
+        content = product_content(product)
+        document = create_document(content)
+        if product_table is not None:
+            product_table.add(document.metadata['product_id'], product)
+        yield document
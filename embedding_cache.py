@@ -0,0 +1,216 @@
+import os
+import json
+import hashlib
+import threading
+from functools import lru_cache
+from collections import OrderedDict
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_community.embeddings import SentenceTransformerEmbeddings
+from tracing import span, count
+from config import embedding_model_name, embedding_cache_directory, embedding_cache_size, query_cache_size
+
+
+class LazyEmbeddings(Embeddings):
+    """
+    Builds the embedding model on first use instead of at import time.
+    load_in_background() starts loading it on a thread so startup can do other work meanwhile;
+    the first embed call waits for the load to finish.
+    """
+
+    def __init__(self, factory):
+        self.factory = factory
+        self.model = None
+        self.lock = threading.Lock()
+
+    def load(self):
+        with self.lock:
+            if self.model is None:
+                self.model = self.factory()
+        return self.model
+
+    def load_in_background(self):
+        thread = threading.Thread(target=self.load, name="embedding-model-load", daemon=True)
+        thread.start()
+        return thread
+
+    def embed_documents(self, texts):
+        return self.load().embed_documents(texts)
+
+    def embed_query(self, text):
+        return self.load().embed_query(text)
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Disk-backed cache in front of an embedding model.
+    Vectors live in a memory-mapped float32 file with one row per slot, and a JSON index maps
+    hash(model name + text) to a slot. When the cache is full the least recently used slot is reused.
+    A read_only cache still serves hits but stores no new vectors, so forked workers never write the shared files.
+    """
+
+    def __init__(self, embeddings, model_name, cache_directory, max_entries):
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.max_entries = max_entries
+        self.vectors_path = os.path.join(cache_directory, 'vectors.f32')
+        self.index_path = os.path.join(cache_directory, 'index.json')
+        self.lock = threading.Lock()
+        self.slots = OrderedDict()   # key -> slot, least recently used first
+        self.dim = None
+        self.vectors = None
+        self.read_only = False
+        os.makedirs(cache_directory, exist_ok=True)
+        self._load()
+
+    def _key(self, text):
+        return hashlib.sha1(f"{self.model_name}\0{text}".encode('utf-8')).hexdigest()
+
+    def _load(self):
+        if not os.path.exists(self.index_path) or not os.path.exists(self.vectors_path):
+            return
+        try:
+            with open(self.index_path, encoding='utf-8') as f:
+                index = json.load(f)
+            if index['max_entries'] != self.max_entries:
+                return  # Size changed, start over
+            self.dim = index['dim']
+            self.slots = OrderedDict(index['slots'])
+            self.vectors = np.memmap(self.vectors_path, dtype=np.float32, mode='r+',
+                                     shape=(self.max_entries, self.dim))
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Ignoring unreadable embedding cache: {e}")
+            self.dim, self.vectors, self.slots = None, None, OrderedDict()
+
+    def _save(self):
+        self.vectors.flush()
+        tmp_path = self.index_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'dim': self.dim, 'max_entries': self.max_entries, 'slots': list(self.slots.items())}, f)
+        os.replace(tmp_path, self.index_path)
+
+    def _store(self, key, vector):
+        if self.vectors is None:
+            self.dim = len(vector)
+            self.vectors = np.memmap(self.vectors_path, dtype=np.float32, mode='w+',
+                                     shape=(self.max_entries, self.dim))
+        if len(self.slots) < self.max_entries:
+            slot = len(self.slots)
+        else:
+            _, slot = self.slots.popitem(last=False)  # Evict least recently used
+        self.vectors[slot] = vector
+        self.slots[key] = slot
+
+    def embed_documents(self, texts):
+        keys = [self._key(text) for text in texts]
+        results = [None] * len(texts)
+        missing = {}   # key -> positions in texts
+        with self.lock:
+            for i, key in enumerate(keys):
+                slot = self.slots.get(key)
+                if slot is None:
+                    missing.setdefault(key, []).append(i)
+                else:
+                    self.slots.move_to_end(key)
+                    results[i] = self.vectors[slot].tolist()
+
+        if missing:
+            new_vectors = self.embeddings.embed_documents([texts[positions[0]] for positions in missing.values()])
+            if self.read_only:
+                for positions, vector in zip(missing.values(), new_vectors):
+                    for i in positions:
+                        results[i] = list(vector)
+                return results
+            with self.lock:
+                for (key, positions), vector in zip(missing.items(), new_vectors):
+                    self._store(key, vector)
+                    for i in positions:
+                        results[i] = list(vector)
+                self._save()
+        return results
+
+    def embed_query(self, text):
+        return self.embeddings.embed_query(text)
+
+
+class QueryCachedEmbeddings(Embeddings):
+    """
+    Bounded LRU cache of query embeddings, keyed on the normalized query text.
+    Popular queries skip the embedding model entirely; hits and misses are counted.
+    """
+
+    def __init__(self, embeddings, max_size):
+        self.embeddings = embeddings
+        self.max_size = max_size
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def normalize(text):
+        return ' '.join(text.lower().split())
+
+    def embed_documents(self, texts):
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text):
+        key = self.normalize(text)
+        with self.lock:
+            vector = self.cache.get(key)
+            if vector is not None:
+                self.cache.move_to_end(key)
+                self.hits += 1
+                count("query_embedding_cache", "hit")
+                return vector
+            self.misses += 1
+        count("query_embedding_cache", "miss")
+        with span("embed"):
+            vector = self.embeddings.embed_query(key)
+        self._put(key, vector)
+        return vector
+
+    def _put(self, key, vector):
+        with self.lock:
+            self.cache[key] = vector
+            self.cache.move_to_end(key)
+            while len(self.cache) > self.max_size:
+                self.cache.popitem(last=False)
+
+    def load_in_background(self):
+        """Start loading the underlying model on a background thread. Returns the thread."""
+        return self.embeddings.embeddings.load_in_background()
+
+    def freeze_document_cache(self):
+        """Stop writing new document vectors to the on-disk cache, e.g. before forking workers."""
+        self.embeddings.read_only = True
+
+    def warm(self, queries):
+        """Pre-compute embeddings for the given queries without touching the hit/miss counters."""
+        for query in queries:
+            key = self.normalize(query)
+            if key and key not in self.cache:
+                self._put(key, self.embeddings.embed_query(key))
+
+    def stats(self):
+        return {'size': len(self.cache), 'hits': self.hits, 'misses': self.misses}
+
+
+def load_top_queries(path):
+    """Saved list of popular production queries, one per line. Missing file means no queries."""
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding='utf-8') as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+@lru_cache(maxsize=None)
+def get_embedding_function():
+    """
+    The process-wide embedding function: query LRU cache over the on-disk document cache over the model.
+    The model itself is only loaded on first use, or when load_in_background() is called.
+    """
+    embedding = LazyEmbeddings(lambda: SentenceTransformerEmbeddings(model_name=embedding_model_name))
+    cached = CachedEmbeddings(embedding, embedding_model_name, embedding_cache_directory, embedding_cache_size)
+    return QueryCachedEmbeddings(cached, query_cache_size)
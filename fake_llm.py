@@ -0,0 +1,168 @@
+"""
+Offline stand-in for the chat model, so the agent, tools, memory and UI can run and be benchmarked
+without network access or an API key.
+
+FakeChatModel answers the agent's ReAct prompts from recorded transcripts when it has one for the
+user's message and step, and otherwise from scripted rules. Synthetic latency and token rate make
+its timing look like a real model's while staying deterministic.
+Transcripts are recorded from live runs by attaching a TranscriptRecorder to the real model.
+"""
+import re
+import json
+import time
+import asyncio
+import threading
+from typing import Any, Dict
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from prompts import AI_PREFIX
+
+INPUT_PATTERN = re.compile(r"New input: (.*)\n")
+OBSERVATION_PATTERN = re.compile(r"Observation: (.*?)\nThought:", re.DOTALL)
+TOKEN_PATTERN = re.compile(r"\s*\S+")
+
+# Scripted policy: the first rule matching the user's message decides the tool and its input.
+# An input of None means the tool takes no input, a tool of None means answer directly.
+SCRIPT_RULES = [
+    (re.compile(r"^\s*(hi|hello|hey)\b", re.IGNORECASE), None, "Hello, how can I assist you today!"),
+    (re.compile(r"\badd (?:the |a |an )?(.+?)(?: to (?:my |the )?cart)?\s*$", re.IGNORECASE), "Add to Cart", 1),
+    (re.compile(r"\b(total|how much)\b.*\b(cart|order|pay)\b", re.IGNORECASE), "Calculate Total Price", None),
+    (re.compile(r"\b(place|make|confirm)\b.*\border\b|\bcheckout\b", re.IGNORECASE), "Make an Order", None),
+    (re.compile(r"(.+)"), "Search for Electronic Products", 1),
+]
+
+
+def parse_agent_prompt(prompt):
+    """The user's message and the observations so far in a ReAct prompt, or (None, []) for other prompts."""
+    inputs = INPUT_PATTERN.findall(prompt)
+    if not inputs:
+        return None, []
+    scratchpad = prompt[prompt.rfind("New input: "):]
+    return inputs[-1].strip(), OBSERVATION_PATTERN.findall(scratchpad)
+
+
+def scripted_response(user_input, observations):
+    """One ReAct step for the given message: call the tool its rule picks, then answer with the observation."""
+    if observations:
+        return f"Thought: Do I need to use a tool? No\n{AI_PREFIX}: {observations[-1].strip()}"
+    for pattern, tool, action_input in SCRIPT_RULES:
+        match = pattern.search(user_input)
+        if not match:
+            continue
+        if tool is None:
+            return f"Thought: Do I need to use a tool? No\n{AI_PREFIX}: {action_input}"
+        action_input = match.group(action_input).strip() if action_input else "None"
+        return f"Thought: Do I need to use a tool? Yes\nAction: {tool}\nAction Input: {action_input}"
+
+
+def load_transcripts(path):
+    """Recorded responses keyed by (user message, step), from a JSONL file written by TranscriptRecorder."""
+    transcripts = {}
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                transcripts[(record['input'], record['step'])] = record['output']
+    return transcripts
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Deterministic chat model for offline runs.
+    A call first waits latency seconds, then produces the response at tokens_per_second, streaming
+    it token by token when streaming is on. Responses come from transcripts, keyed by the user's
+    message and the number of tool observations so far, and fall back to the scripted rules.
+    """
+    transcripts: Dict[Any, str] = {}
+    latency: float = 0.3
+    tokens_per_second: float = 100.0
+    streaming: bool = True
+    default_response: str = "The customer asked about electronic products."   # For prompts that are not agent steps
+    replayed: int = 0
+    scripted: int = 0
+
+    @property
+    def _llm_type(self):
+        return "fake-chat"
+
+    def respond(self, prompt):
+        """The response text for a prompt, before stop sequences are applied."""
+        user_input, observations = parse_agent_prompt(prompt)
+        if user_input is None:
+            return self.default_response
+        response = self.transcripts.get((user_input, len(observations)))
+        if response is not None:
+            self.replayed += 1
+            return response
+        self.scripted += 1
+        return scripted_response(user_input, observations)
+
+    def _response_tokens(self, messages, stop):
+        text = self.respond(messages[-1].content)
+        for sequence in stop or []:
+            if sequence in text:
+                text = text[:text.index(sequence)]
+        return TOKEN_PATTERN.findall(text)
+
+    def _token_delay(self):
+        return 1.0 / self.tokens_per_second if self.tokens_per_second else 0.0
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        tokens = self._response_tokens(messages, stop)
+        time.sleep(self.latency + len(tokens) * self._token_delay())
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="".join(tokens)))])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        tokens = self._response_tokens(messages, stop)
+        await asyncio.sleep(self.latency + len(tokens) * self._token_delay())
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="".join(tokens)))])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        tokens = self._response_tokens(messages, stop)
+        time.sleep(self.latency)
+        for token in tokens:
+            time.sleep(self._token_delay())
+            if run_manager:
+                run_manager.on_llm_new_token(token)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        tokens = self._response_tokens(messages, stop)
+        await asyncio.sleep(self.latency)
+        for token in tokens:
+            await asyncio.sleep(self._token_delay())
+            if run_manager:
+                await run_manager.on_llm_new_token(token)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+
+    def get_num_tokens(self, text):
+        # Roughly four characters per token, without loading a tokenizer
+        return max(1, len(text) // 4)
+
+
+class TranscriptRecorder(BaseCallbackHandler):
+    """Appends every agent step of a live model to a JSONL file that FakeChatModel can replay."""
+
+    def __init__(self, path):
+        self.path = path
+        self.prompts = {}   # run ID -> (user message, step)
+        self.lock = threading.Lock()
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        user_input, observations = parse_agent_prompt(messages[0][-1].content)
+        if user_input is not None:
+            self.prompts[run_id] = (user_input, len(observations))
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        key = self.prompts.pop(run_id, None)
+        if key is None:
+            return
+        record = {'input': key[0], 'step': key[1], 'output': response.generations[0][0].text}
+        with self.lock, open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record) + "\n")
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self.prompts.pop(run_id, None)
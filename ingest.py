@@ -0,0 +1,117 @@
+"""
+Bulk catalog ingestion for large product files.
+
+    python ingest.py products.csv more_products/ --workers 8 --batch-size 4096
+
+CSV files are split into byte ranges that are parsed and validated in a process pool.
+Valid products are embedded and written to the vector store in fixed-size batches,
+one bulk write per batch, and products that are no longer in any input file are removed.
+A snapshot of the product table is saved next to the index, so the chatbot can start without re-reading the CSVs.
+Rows must not contain line breaks inside quoted fields, since shards are cut on line boundaries.
+"""
+import os
+import csv
+import time
+import argparse
+from multiprocessing import Pool
+
+from config import csv_file
+from catalog import ProductTable, save_snapshot
+from data_loading import parse_product
+from doc_creator import create_documents
+from vector_store import get_vector_store, get_lexical_index, sync_documents, snapshot_path
+
+SHARD_BYTES = 8 * 1024 * 1024
+
+
+def find_csv_files(paths):
+    """Expand the given files and directories into a sorted list of CSV files."""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                files.extend(os.path.join(root, name) for name in names if name.lower().endswith('.csv'))
+        else:
+            files.append(path)
+    return sorted(files)
+
+
+def shard_file(path, shard_bytes=SHARD_BYTES):
+    """Split a CSV file into (path, header, start, end) byte ranges that begin and end on line boundaries."""
+    size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        header_line = f.readline()
+        header = next(csv.reader([header_line.decode('utf-8-sig')]))
+        shards = []
+        start = f.tell()
+        while start < size:
+            f.seek(min(start + shard_bytes, size))
+            f.readline()  # Move to the start of the next line
+            end = min(f.tell(), size)
+            shards.append((path, header, start, end))
+            start = end
+    return shards
+
+
+def parse_shard(shard):
+    """Parse and validate one byte range. Returns every valid product record and the number of skipped rows."""
+    path, header, start, end = shard
+    with open(path, 'rb') as f:
+        f.seek(start)
+        lines = f.read(end - start).decode('utf-8').splitlines()
+
+    products = []
+    skipped = 0
+    for row in csv.reader(lines):
+        if not row:
+            continue
+        product = parse_product(dict(zip(header, row)))
+        if product:
+            products.append(product)
+        else:
+            skipped += 1
+    return products, skipped
+
+
+def ingest(paths, workers=None, batch_size=4096):
+    """
+    Ingest one or more CSV files (or directories of them) into the vector store.
+    Returns:
+    tuple: (number of products added, number of products removed)
+    """
+    files = find_csv_files(paths)
+    shards = [shard for path in files for shard in shard_file(path)]
+    print(f"Ingesting {len(files)} file(s) in {len(shards)} shard(s).")
+
+    skipped = 0
+    start_time = time.time()
+
+    def report(rows, added):
+        elapsed = time.time() - start_time
+        print(f"{rows} rows, {added} embedded, {rows / elapsed if elapsed else 0:.0f} rows/sec")
+
+    product_table = ProductTable()
+    with Pool(processes=workers) as pool:
+        def products():
+            nonlocal skipped
+            # Hand out a few shards at a time so parsed rows never pile up ahead of the embedder
+            window = 2 * (workers or os.cpu_count() or 1)
+            for i in range(0, len(shards), window):
+                for shard_products, shard_skipped in pool.imap(parse_shard, shards[i:i + window]):
+                    skipped += shard_skipped
+                    yield from shard_products
+
+        added, removed = sync_documents(get_vector_store(), create_documents(products(), product_table),
+                                        batch_size=batch_size, report=report, lexical_index=get_lexical_index())
+    save_snapshot(product_table, snapshot_path(), files)
+    print(f"Done: {added} added, {removed} removed, {skipped} malformed rows skipped.")
+    return added, removed
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Ingest product CSV files into the vector store.")
+    parser.add_argument('paths', nargs='*', default=[csv_file], help="CSV files or directories")
+    parser.add_argument('--workers', type=int, default=None, help="Parser processes (default: all cores)")
+    parser.add_argument('--batch-size', type=int, default=4096, help="Products embedded and written per batch")
+    args = parser.parse_args()
+    ingest(args.paths, workers=args.workers, batch_size=args.batch_size)
@@ -0,0 +1,102 @@
+import os
+import math
+import pickle
+from collections import Counter, defaultdict
+
+from name_index import normalize
+
+
+def tokenize(text):
+    """Words of the text, plus adjacent pairs glued together so 'RTX 3080' also matches 'rtx3080'."""
+    words = normalize(text).split()
+    return words + [a + b for a, b in zip(words, words[1:])]
+
+
+def lexical_text(content):
+    """The parts of a product's embedded text worth indexing: category, name and description."""
+    parts = []
+    for line in content.split('\n'):
+        key, _, value = line.partition(': ')
+        if key in ('Category', 'Product', 'Description'):
+            parts.append(value)
+    return ' '.join(parts)
+
+
+class LexicalIndex:
+    """
+    BM25 inverted index over product category, name and description, keyed by product ID.
+    It is kept in step with the vector store by sync_documents and saved next to it.
+    """
+
+    def __init__(self, path=None, k1=1.5, b=0.75):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self.postings = defaultdict(dict)   # term -> {product ID: term frequency}
+        self.doc_terms = {}                 # product ID -> distinct terms, for removal
+        self.doc_lengths = {}
+        self.total_length = 0
+
+    @classmethod
+    def load(cls, path):
+        """Load the index saved at path, or start an empty one that will be saved there."""
+        if os.path.exists(path):
+            try:
+                with open(path, 'rb') as f:
+                    index = pickle.load(f)
+                index.path = path
+                return index
+            except (OSError, pickle.UnpicklingError, EOFError) as e:
+                print(f"Rebuilding unreadable lexical index: {e}")
+        return cls(path)
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self.path)
+
+    def __contains__(self, product_id):
+        return product_id in self.doc_lengths
+
+    def __len__(self):
+        return len(self.doc_lengths)
+
+    def add(self, product_id, text):
+        if product_id in self:
+            return
+        counts = Counter(tokenize(text))
+        for term, count in counts.items():
+            self.postings[term][product_id] = count
+        self.doc_terms[product_id] = list(counts)
+        length = sum(counts.values())
+        self.doc_lengths[product_id] = length
+        self.total_length += length
+
+    def remove(self, product_id):
+        if product_id not in self:
+            return
+        for term in self.doc_terms.pop(product_id):
+            docs = self.postings[term]
+            docs.pop(product_id, None)
+            if not docs:
+                del self.postings[term]
+        self.total_length -= self.doc_lengths.pop(product_id)
+
+    def search(self, query, k):
+        """Top k (product ID, score) pairs for the query, best first."""
+        n_docs = len(self.doc_lengths)
+        if not n_docs:
+            return []
+        avg_length = self.total_length / n_docs
+        scores = defaultdict(float)
+        for term in set(tokenize(query)):
+            docs = self.postings.get(term)
+            if not docs:
+                continue
+            idf = math.log(1 + (n_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+            for product_id, tf in docs.items():
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[product_id] / avg_length)
+                scores[product_id] += idf * tf * (self.k1 + 1) / (tf + norm)
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
@@ -0,0 +1,53 @@
+from functools import lru_cache
+
+import httpx
+from langchain_groq import ChatGroq
+from fake_llm import FakeChatModel, TranscriptRecorder, load_transcripts
+from llm_scheduler import RequestScheduler, ScheduledTransport, ScheduledSyncTransport
+from config import (llm_model, llm_backend, llm_timeout, fake_llm_latency, fake_llm_tokens_per_second,
+                    fake_llm_transcripts, record_transcripts, llm_max_connections, llm_max_concurrent,
+                    llm_token_reserve, llm_max_retries)
+
+
+@lru_cache(maxsize=None)
+def get_scheduler():
+    """The process-wide LLM request scheduler."""
+    return RequestScheduler(max_concurrent=llm_max_concurrent, token_reserve=llm_token_reserve,
+                            max_retries=llm_max_retries)
+
+
+@lru_cache(maxsize=None)
+def get_http_clients():
+    """
+    The process-wide (sync, async) HTTP clients for the LLM API: pooled keep-alive connections,
+    with every request sent through the scheduler. Connections are only opened on first use,
+    so clients created before forking are safe to use in the workers.
+    """
+    limits = httpx.Limits(max_connections=llm_max_connections, max_keepalive_connections=llm_max_connections)
+    timeout = httpx.Timeout(llm_timeout)
+    scheduler = get_scheduler()
+    sync_client = httpx.Client(
+        transport=ScheduledSyncTransport(scheduler, httpx.HTTPTransport(limits=limits)), timeout=timeout)
+    async_client = httpx.AsyncClient(
+        transport=ScheduledTransport(scheduler, httpx.AsyncHTTPTransport(limits=limits)), timeout=timeout)
+    return sync_client, async_client
+
+
+def get_llm():
+    """
+    The chat model selected by config.llm_backend: Groq, or the offline FakeChatModel that replays
+    recorded transcripts and follows scripted rules otherwise.
+    Groq requests share the pooled clients, and retries are left to the scheduler.
+    """
+    if llm_backend == 'fake':
+        return FakeChatModel(
+            transcripts=load_transcripts(fake_llm_transcripts) if fake_llm_transcripts else {},
+            latency=fake_llm_latency,
+            tokens_per_second=fake_llm_tokens_per_second,
+        )
+    if llm_backend != 'groq':
+        raise ValueError(f"Unknown LLM backend: {llm_backend!r}")
+    callbacks = [TranscriptRecorder(record_transcripts)] if record_transcripts else None
+    http_client, http_async_client = get_http_clients()
+    return ChatGroq(temperature=0.2, model=llm_model, streaming=True, timeout=llm_timeout, max_retries=0,
+                    http_client=http_client, http_async_client=http_async_client, callbacks=callbacks)
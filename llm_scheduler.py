@@ -0,0 +1,246 @@
+"""
+Rate-limit-aware scheduling of LLM API requests.
+
+All requests of a process go through one pooled httpx client whose transport asks the
+RequestScheduler for a slot first. The scheduler caps the requests in flight, hands free slots
+to waiting sessions round-robin so one busy session can't starve the others, and pauses new
+requests when the API's rate-limit headers say the minute's requests or tokens are used up.
+Rate-limited (429) and transient server errors are retried with jittered exponential backoff,
+so bursts queue up instead of failing.
+"""
+import re
+import time
+import random
+import asyncio
+import contextvars
+from collections import OrderedDict, deque
+
+import httpx
+from tracing import span, count
+
+# Session the current request belongs to, set by the chat UI for each turn
+llm_session = contextvars.ContextVar('llm_session', default=None)
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+DURATION_PATTERN = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+DURATION_UNITS = {'ms': 0.001, 's': 1.0, 'm': 60.0, 'h': 3600.0}
+
+
+def parse_duration(value):
+    """Seconds in a rate-limit reset header such as '7.66s', '1m26.4s' or '120ms'. None if missing."""
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = DURATION_PATTERN.findall(value)
+    if not parts:
+        return None
+    return sum(float(number) * DURATION_UNITS[unit] for number, unit in parts)
+
+
+def parse_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class RequestScheduler:
+    """
+    Admits LLM requests in fair order across sessions.
+    At most max_concurrent requests are in flight. While the remaining requests, or the remaining
+    tokens minus token_reserve, of the current rate-limit window are used up, new requests wait
+    for the window to reset. Waiting requests are granted one per session in turn.
+    """
+
+    def __init__(self, max_concurrent=8, token_reserve=2000, max_retries=5, base_delay=0.5, max_delay=30.0):
+        self.max_concurrent = max_concurrent
+        self.token_reserve = token_reserve
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.in_flight = 0
+        self.queues = OrderedDict()   # session -> waiting futures, sessions in round-robin order
+        self.paused_until = 0.0       # time.monotonic() before which no request is started
+        self.wake_handle = None
+        self.remaining_requests = None
+        self.remaining_tokens = None
+        self.retries = 0
+
+    def _can_start(self):
+        return self.in_flight < self.max_concurrent and time.monotonic() >= self.paused_until
+
+    async def acquire(self, session):
+        """Wait for a request slot. Every acquire must be followed by one release."""
+        if not self.queues and self._can_start():
+            self.in_flight += 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        self.queues.setdefault(session, deque()).append(future)
+        self._dispatch()
+        try:
+            with span("llm_queue"):
+                await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self.release()   # Granted just as the caller gave up
+            raise
+
+    def release(self):
+        self.in_flight -= 1
+        self._dispatch()
+
+    def _dispatch(self):
+        """Grant free slots to waiting sessions round-robin, or wake up again when a pause ends."""
+        while self.queues and self._can_start():
+            session, queue = next(iter(self.queues.items()))
+            future = queue.popleft()
+            if queue:
+                self.queues.move_to_end(session)
+            else:
+                del self.queues[session]
+            if future.done():
+                continue   # Cancelled while waiting
+            self.in_flight += 1
+            future.set_result(None)
+        delay = self.paused_until - time.monotonic()
+        if self.queues and delay > 0 and self.wake_handle is None:
+            self.wake_handle = asyncio.get_running_loop().call_later(delay, self._wake)
+
+    def _wake(self):
+        self.wake_handle = None
+        self._dispatch()
+
+    def pause(self, seconds):
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def update(self, headers):
+        """Track the rate-limit headers of a response and pause when the window is used up."""
+        remaining_requests = parse_int(headers.get('x-ratelimit-remaining-requests'))
+        remaining_tokens = parse_int(headers.get('x-ratelimit-remaining-tokens'))
+        if remaining_requests is not None:
+            self.remaining_requests = remaining_requests
+            if remaining_requests <= 0:
+                self.pause(parse_duration(headers.get('x-ratelimit-reset-requests')) or 1.0)
+        if remaining_tokens is not None:
+            self.remaining_tokens = remaining_tokens
+            if remaining_tokens <= self.token_reserve:
+                self.pause(parse_duration(headers.get('x-ratelimit-reset-tokens')) or 1.0)
+
+    def backoff(self, attempt, retry_after=None):
+        """Seconds to wait before retry number attempt: full jitter, but never less than Retry-After."""
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        return max(delay, retry_after or 0.0)
+
+    def stats(self):
+        return {
+            'in_flight': self.in_flight,
+            'waiting': sum(len(queue) for queue in self.queues.values()),
+            'remaining_requests': self.remaining_requests,
+            'remaining_tokens': self.remaining_tokens,
+            'retries': self.retries,
+        }
+
+
+class ReleasingStream(httpx.AsyncByteStream):
+    """Response body that gives the request slot back once it has been read or closed."""
+
+    def __init__(self, stream, release):
+        self.stream = stream
+        self.release = release
+
+    async def __aiter__(self):
+        async for chunk in self.stream:
+            yield chunk
+
+    async def aclose(self):
+        try:
+            await self.stream.aclose()
+        finally:
+            if self.release is not None:
+                self.release()
+                self.release = None
+
+
+class ScheduledTransport(httpx.AsyncBaseTransport):
+    """httpx transport that sends every request through the scheduler and retries with backoff."""
+
+    def __init__(self, scheduler, transport):
+        self.scheduler = scheduler
+        self.transport = transport
+
+    async def handle_async_request(self, request):
+        scheduler = self.scheduler
+        session = llm_session.get()
+        for attempt in range(scheduler.max_retries + 1):
+            await scheduler.acquire(session)
+            try:
+                response = await self.transport.handle_async_request(request)
+            except httpx.TransportError:
+                scheduler.release()
+                if attempt == scheduler.max_retries:
+                    raise
+                count("llm_retries", "connection")
+                scheduler.retries += 1
+                await asyncio.sleep(scheduler.backoff(attempt))
+                continue
+
+            scheduler.update(response.headers)
+            if response.status_code not in RETRY_STATUSES or attempt == scheduler.max_retries:
+                return httpx.Response(response.status_code, headers=response.headers,
+                                      stream=ReleasingStream(response.stream, scheduler.release),
+                                      extensions=response.extensions)
+
+            await response.aclose()
+            scheduler.release()
+            count("llm_retries", str(response.status_code))
+            scheduler.retries += 1
+            delay = scheduler.backoff(attempt, parse_duration(response.headers.get('retry-after')))
+            if response.status_code == 429:
+                scheduler.pause(delay)   # The limit is shared, so every session waits
+            await asyncio.sleep(delay)
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+
+class ScheduledSyncTransport(httpx.BaseTransport):
+    """
+    Blocking counterpart for the few synchronous calls (startup warm-up, history summaries):
+    waits out scheduler pauses and retries with backoff, but does not take part in the fair queue.
+    """
+
+    def __init__(self, scheduler, transport):
+        self.scheduler = scheduler
+        self.transport = transport
+
+    def handle_request(self, request):
+        scheduler = self.scheduler
+        for attempt in range(scheduler.max_retries + 1):
+            wait = scheduler.paused_until - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+            try:
+                response = self.transport.handle_request(request)
+            except httpx.TransportError:
+                if attempt == scheduler.max_retries:
+                    raise
+                scheduler.retries += 1
+                time.sleep(scheduler.backoff(attempt))
+                continue
+
+            scheduler.update(response.headers)
+            if response.status_code not in RETRY_STATUSES or attempt == scheduler.max_retries:
+                return response
+
+            response.close()
+            scheduler.retries += 1
+            delay = scheduler.backoff(attempt, parse_duration(response.headers.get('retry-after')))
+            if response.status_code == 429:
+                scheduler.pause(delay)
+            time.sleep(delay)
+
+    def close(self):
+        self.transport.close()
@@ -0,0 +1,155 @@
+"""
+Load test for the chat stack: how many concurrent shoppers one process can serve.
+
+    python loadtest.py --sessions 50 --conversations 2 --latency 0.3 --tokens-per-second 100
+
+Every simulated session gets its own memory, cart, tools and agent, built with the same
+setup_agent and get_tools as the app, and runs a scripted shopping conversation:
+search, add to cart, total, order. All sessions run concurrently on one event loop, like
+Panel sessions do. The LLM is the offline FakeChatModel, so runs are reproducible; --live
+uses the configured LLM instead. --router sends turns through the IntentRouter first, as the UI does.
+With TRACING=1 the stage histograms are also served on the metrics endpoint while the test runs.
+Reports throughput and p50/p95/p99 latency per turn type and per tool. Exits with status 1 if any turn failed.
+"""
+import sys
+import time
+import asyncio
+import argparse
+from collections import defaultdict
+
+from langchain_core.callbacks import AsyncCallbackHandler
+from config import cart_idle_ttl
+from retrieval import load_retriever
+from embedding_cache import get_embedding_function
+from memory import get_memory
+from cart import CartStore
+from router import IntentRouter
+from tools import get_tools
+from prompts import get_context_prompt
+from agent import setup_agent
+from fake_llm import FakeChatModel
+from llm import get_llm
+from tracing import turn, tracing_callbacks, start_metrics_server
+from llm_scheduler import llm_session
+
+# (turn type, message template) of one scripted conversation
+CONVERSATION = [
+    ("search", "Do you have any {category}?"),
+    ("add", "add {product} to my cart"),
+    ("total", "What is the total price of my cart?"),
+    ("order", "I'd like to place my order"),
+]
+
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, round(p / 100 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+class ToolTimer(AsyncCallbackHandler):
+    """Records the duration of every tool call, by tool name."""
+
+    def __init__(self, durations):
+        self.durations = durations
+        self.started = {}   # run ID -> (tool name, start time)
+
+    async def on_tool_start(self, serialized, input_str, *, run_id, **kwargs):
+        self.started[run_id] = (serialized.get("name"), time.perf_counter())
+
+    async def on_tool_end(self, output, *, run_id, **kwargs):
+        name, start = self.started.pop(run_id, (None, None))
+        if name is not None:
+            self.durations[name].append(time.perf_counter() - start)
+
+    async def on_tool_error(self, error, *, run_id, **kwargs):
+        self.started.pop(run_id, None)
+
+
+async def run_session(index, llm, retriever, cart_store, conversations, think_time, use_router, results):
+    """Run the scripted conversation conversations times in one session, recording every turn."""
+    session_id = f"load-{index}"
+    llm_session.set(session_id)
+    tools = get_tools(retriever, cart_store, session_id)
+    agent = setup_agent(llm, tools, get_memory(llm), get_context_prompt(tools))
+    agent.verbose = False
+    router = IntentRouter(tools) if use_router else None
+    timer = ToolTimer(results['tools'])
+    table = retriever.product_table
+    row = index % len(table)   # Each session shops for its own product, the same one on every run
+    variables = {'category': table.categories[row], 'product': table.names[row]}
+
+    for _ in range(conversations):
+        for turn_type, template in CONVERSATION:
+            message = template.format(**variables)
+            start = time.perf_counter()
+            try:
+                with turn(session_id):
+                    routed = await asyncio.to_thread(router.route, message) if router else None
+                    if routed is None:
+                        await agent.ainvoke({"input": message}, config={"callbacks": [timer] + tracing_callbacks()})
+            except Exception as e:
+                results['errors'].append(f"{session_id} {turn_type}: {e}")
+                continue
+            results['turns'][turn_type].append(time.perf_counter() - start)
+            if think_time:
+                await asyncio.sleep(think_time)
+        cart_store.drop(session_id)
+
+
+def report(title, durations):
+    print(f"\n{title:<32} {'count':>7} {'p50':>8} {'p95':>8} {'p99':>8}")
+    for name, values in sorted(durations.items()):
+        values = sorted(values)
+        print(f"{name:<32} {len(values):7d} " +
+              " ".join(f"{percentile(values, p) * 1000:6.0f}ms" for p in (50, 95, 99)))
+
+
+async def load_test(llm, sessions, conversations=1, think_time=0.0, use_router=False):
+    """
+    Run sessions concurrent scripted sessions and print throughput and latency percentiles.
+    Returns:
+    dict: turn latencies by turn type, tool latencies by tool name and error messages.
+    """
+    retriever = load_retriever()
+    get_embedding_function().embed_query("warm up")
+    cart_store = CartStore(ttl=cart_idle_ttl)
+    results = {'turns': defaultdict(list), 'tools': defaultdict(list), 'errors': []}
+
+    start_time = time.perf_counter()
+    await asyncio.gather(*(
+        run_session(i, llm, retriever, cart_store, conversations, think_time, use_router, results)
+        for i in range(sessions)
+    ))
+    elapsed = time.perf_counter() - start_time
+
+    # Failed turns come first: percentiles over the turns that happened to succeed are not a result
+    errors = results['errors']
+    if errors:
+        print(f"FAILED: {len(errors)} of {len(errors) + sum(map(len, results['turns'].values()))} turns raised")
+        for error in errors[:10]:
+            print(f"Error: {error}")
+    turns = sum(len(values) for values in results['turns'].values())
+    print(f"{sessions} sessions, {turns} turns in {elapsed:.2f}s: {turns / elapsed:.1f} turns/sec, "
+          f"{sessions * conversations / elapsed:.2f} conversations/sec, {len(errors)} errors")
+    report("Turn", {**results['turns'], "all": [v for values in results['turns'].values() for v in values]})
+    report("Tool", results['tools'])
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Drive the agent stack with concurrent scripted shopping sessions.")
+    parser.add_argument('--sessions', type=int, default=10, help="Concurrent sessions")
+    parser.add_argument('--conversations', type=int, default=1, help="Scripted conversations per session")
+    parser.add_argument('--think-time', type=float, default=0.0, help="Seconds a session waits between turns")
+    parser.add_argument('--latency', type=float, default=0.3, help="Fake LLM seconds before the first token")
+    parser.add_argument('--tokens-per-second', type=float, default=100.0, help="Fake LLM token rate, 0 for instant")
+    parser.add_argument('--router', action='store_true', help="Route simple intents before the agent, like the UI")
+    parser.add_argument('--live', action='store_true', help="Use the configured LLM instead of the fake one")
+    args = parser.parse_args()
+    start_metrics_server()
+    llm = get_llm() if args.live else FakeChatModel(latency=args.latency, tokens_per_second=args.tokens_per_second)
+    results = asyncio.run(load_test(llm, args.sessions, args.conversations, args.think_time, args.router))
+    sys.exit(1 if results['errors'] else 0)
@@ -1,40 +1,115 @@
-from config import api_key, persist_directory
-from data_loading import load_data
-from doc_creator import create_documents
-from vector_store import initialize_vector_store
+import gc
+import time
+import threading
+from contextlib import contextmanager
+
+startup_time = time.perf_counter()
+
+from config import (vector_backend, warm_query_cache, top_queries_file,
+                    cart_idle_ttl, response_cache_threshold, response_cache_size, serve_port, serve_workers,
+                    reindex_on_start, warm_llm_connection)
+from retrieval import load_retriever
+from embedding_cache import get_embedding_function, load_top_queries
 from memory import get_memory
+from cart import CartStore
+from semantic_cache import SemanticResponseCache
+from router import IntentRouter, get_intent_classifier
 from tools import get_tools
-from prompts import get_context_prompt
+from prompts import get_context_prompt, warm_example_selector
 from agent import setup_agent
 from ui import setup_chat_ui
+from llm import get_llm
+from tracing import start_metrics_server
 
-from groq import Groq
-from langchain_groq import ChatGroq
 import panel as pn
 
-# Initialize API
-client = Groq(api_key=api_key)
-llm_model = "llama3-groq-70b-8192-tool-use-preview"
-llm = ChatGroq(temperature=0.2, model=llm_model)
 
-# Load data
-data = load_data()
-documents = create_documents(data)
+@contextmanager
+def startup_phase(name):
+    """Print how long a startup phase took."""
+    start = time.perf_counter()
+    yield
+    print(f"Startup: {name} took {time.perf_counter() - start:.2f}s")
+
+
+print(f"Startup: imports took {time.perf_counter() - startup_time:.2f}s")
+
+# Forked workers share everything loaded below copy-on-write. That needs the memory-mapped NumPy index,
+# and one torch thread per worker so the model is safe to use after fork.
+if serve_workers > 1 and vector_backend != 'numpy':
+    print("Multi-process serving needs VECTOR_BACKEND=numpy, serving from a single process.")
+    serve_workers = 1
+if serve_workers > 1:
+    import torch
+    torch.set_num_threads(1)
+
+# The embedding model loads in the background while the catalog and indexes are read
+model_loading = get_embedding_function().load_in_background()
+
+llm = get_llm()
+
+
+def warm_llm():
+    """Open the connection to the LLM API with a one-token request, so the first user doesn't pay for it."""
+    with startup_phase("LLM connection"):
+        try:
+            llm.bind(max_tokens=1).invoke("Hi")
+        except Exception as e:
+            print(f"Could not warm up the LLM connection: {e}")
+
+
+# Forked workers must not inherit an open connection, so they connect on their first request instead
+llm_warming = None
+if warm_llm_connection and serve_workers == 1:
+    llm_warming = threading.Thread(target=warm_llm, name="llm-warm-up", daemon=True)
+    llm_warming.start()
+
+# Catalog and indexes: start from the snapshot written at ingest time, or rebuild from the CSV
+with startup_phase("catalog and indexes"):
+    retriever = load_retriever(read_only=serve_workers > 1, reindex=reindex_on_start)
+    product_table = retriever.product_table
+
+# Wait for the model, then warm the query embedding cache and the intent classifier
+with startup_phase("embedding model"):
+    model_loading.join()
+    get_embedding_function().embed_query("warm up")
+    if warm_query_cache:
+        get_embedding_function().warm(set(product_table.categories) | set(load_top_queries(top_queries_file)))
+    get_intent_classifier()
+    warm_example_selector()
+
+if llm_warming is not None:
+    llm_warming.join()
+
+# Carts and cached answers, shared by all sessions
+cart_store = CartStore(ttl=cart_idle_ttl)
+response_cache = SemanticResponseCache(get_embedding_function(), threshold=response_cache_threshold,
+                                       max_size=response_cache_size)
+
+
+def create_session():
+    """Build the memory, tools, agent and chat UI of one Panel session."""
+    session_id = pn.state.curdoc.session_context.id
+    start_metrics_server(attempts=serve_workers)   # Once per worker process, each on its own port
+    pn.state.on_session_destroyed(lambda session_context: cart_store.drop(session_context.id))
 
-# Vector store and memory
-vector_store = initialize_vector_store(documents)
-memory = get_memory()
+    memory = get_memory(llm)
+    tools = get_tools(retriever, cart_store, session_id)
+    context_prompt = get_context_prompt(tools)
+    agent = setup_agent(llm, tools, memory, context_prompt)
+    router = IntentRouter(tools)
+    context = []
+    return setup_chat_ui(agent, context, response_cache, router)
 
-# Tools and prompts
-tools = get_tools(vector_store)
-context_prompt = get_context_prompt()
 
-# Agent setup
-agent = setup_agent(llm, tools, memory, context_prompt)
+# Move everything loaded so far out of the garbage collector's view, so collections in the
+# workers don't write to (and un-share) the preloaded pages
+if serve_workers > 1:
+    get_embedding_function().freeze_document_cache()   # Workers must not write the shared cache files
+    gc.collect()
+    gc.freeze()
 
-# Chat UI
-context = []
-chat_ui = setup_chat_ui(agent, context)
+print(f"Ready after {time.perf_counter() - startup_time:.2f}s, serving on port {serve_port}.")
 
-# Use Panel to serve the UI
-pn.serve(chat_ui, port=5000)  
+# Use Panel to serve the UI, one session per browser tab, in serve_workers forked processes
+pn.serve(create_session, port=serve_port, num_procs=serve_workers, show=serve_workers == 1)
@@ -1,4 +1,134 @@
-from langchain.memory import ConversationBufferMemory
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, List
 
-def get_memory():
-    return ConversationBufferMemory(memory_key="chat_history", return_messages=True)
+from langchain.memory.chat_memory import BaseChatMemory
+from langchain.memory.prompt import SUMMARY_PROMPT
+from langchain_core.language_models import BaseLanguageModel
+from langchain_core.messages import SystemMessage, get_buffer_string
+from config import memory_token_budget
+
+# Summaries are folded in the background, after the reply has been sent
+_summarizer = ThreadPoolExecutor(max_workers=2, thread_name_prefix="memory-summary")
+
+
+class TokenBudgetMemory(BaseChatMemory):
+    """
+    Conversation memory with a hard token budget.
+    The most recent turns are kept verbatim; once they exceed max_token_limit, the oldest turns are
+    folded into a running summary on a background thread. Folded turns stay in the history until
+    their summary has been written, and history is always trimmed by whole Human/AI turns.
+    Token counts are computed once per message and cached.
+    """
+    llm: BaseLanguageModel
+    memory_key: str = "chat_history"
+    human_prefix: str = "Human"
+    ai_prefix: str = "AI"
+    max_token_limit: int = 2000
+    summary: str = ""
+    summary_tokens: int = 0
+    token_counts: List[int] = []   # Parallel to chat_memory.messages
+    folding: bool = False          # A background summary is being written
+    summary_lock: Any = None
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.summary_lock = threading.Lock()
+
+    @property
+    def memory_variables(self):
+        return [self.memory_key]
+
+    def _count(self, text):
+        return self.llm.get_num_tokens(text)
+
+    def _update_counts(self):
+        """Count the tokens of messages added since the last call. Call with summary_lock held."""
+        messages = self.chat_memory.messages
+        for message in messages[len(self.token_counts):]:
+            self.token_counts.append(self._count(message.content))
+        return messages
+
+    def load_memory_variables(self, inputs):
+        with self.summary_lock:
+            messages = list(self._update_counts())
+            counts = list(self.token_counts)
+            summary = self.summary
+            budget = self.max_token_limit - self.summary_tokens
+
+        # Newest whole turns (a Human message and its AI reply) that fit in the budget
+        start = len(messages)
+        used = 0
+        while start >= 2 and used + counts[start - 2] + counts[start - 1] <= budget:
+            start -= 2
+            used += counts[start] + counts[start + 1]
+        kept = messages[start:]
+        if summary:
+            kept = [SystemMessage(content=f"Summary of the earlier conversation: {summary}")] + kept
+
+        if self.return_messages:
+            return {self.memory_key: kept}
+        return {self.memory_key: get_buffer_string(kept, human_prefix=self.human_prefix, ai_prefix=self.ai_prefix)}
+
+    def save_context(self, inputs, outputs):
+        super().save_context(inputs, outputs)
+        self._fold_if_over_budget()
+
+    async def asave_context(self, inputs, outputs):
+        await super().asave_context(inputs, outputs)
+        self._fold_if_over_budget()
+
+    def _fold_if_over_budget(self):
+        """Summarize the oldest whole turns off the critical path until the rest fits."""
+        with self.summary_lock:
+            messages = self._update_counts()
+            if self.folding:
+                return
+            total = sum(self.token_counts)
+            cut = 0
+            while total > self.max_token_limit and cut + 2 < len(messages) - 1:
+                total -= self.token_counts[cut] + self.token_counts[cut + 1]
+                cut += 2
+            if not cut:
+                return
+            self.folding = True
+            folded = messages[:cut]
+        _summarizer.submit(self._fold, folded)
+
+    def _fold(self, messages):
+        new_lines = get_buffer_string(messages, human_prefix=self.human_prefix, ai_prefix=self.ai_prefix)
+        try:
+            result = self.llm.invoke(SUMMARY_PROMPT.format(summary=self.summary, new_lines=new_lines))
+            summary = result.content
+            summary_tokens = self._count(summary)
+        except Exception as e:
+            print(f"Could not summarize conversation history: {e}")
+            with self.summary_lock:
+                self.folding = False   # Keep the messages, the next turn tries again
+            return
+        with self.summary_lock:
+            current = self.chat_memory.messages
+            if len(current) < len(messages) or any(a is not b for a, b in zip(current, messages)):
+                self.folding = False   # History was cleared meanwhile
+                return
+            # Swap the folded messages for their summary in one step
+            del self.chat_memory.messages[:len(messages)]
+            del self.token_counts[:len(messages)]
+            self.summary = summary
+            self.summary_tokens = summary_tokens
+            self.folding = False
+
+    def clear(self):
+        with self.summary_lock:
+            super().clear()
+            self.token_counts = []
+            self.summary = ""
+            self.summary_tokens = 0
+
+    async def aclear(self):
+        self.clear()
+
+
+def get_memory(llm):
+    return TokenBudgetMemory(llm=llm, max_token_limit=memory_token_budget, memory_key="chat_history",
+                             input_key="input", output_key="output", return_messages=False)
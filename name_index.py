@@ -0,0 +1,100 @@
+import re
+from collections import defaultdict
+
+_NON_ALNUM = re.compile(r'[^a-z0-9]+')
+MAX_NAME_WORDS = 8
+
+
+def normalize(text):
+    """Lowercase and collapse everything but letters and digits into single spaces."""
+    return _NON_ALNUM.sub(' ', text.lower()).strip()
+
+
+def numbers(text):
+    """Tokens of a normalized text that contain a digit: model numbers, sizes, generations."""
+    return frozenset(word for word in text.split() if any(char.isdigit() for char in word))
+
+
+def trigrams(text):
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class NameIndex:
+    """
+    In-memory product name index used as a fast path before vector search.
+    A query resolves to a product when its normalized text equals a product name, contains exactly one
+    product name as a whole phrase (not counting names inside a longer one), or is a close trigram
+    match (Dice similarity) to a single product with the same numeric tokens, so "Dell XPS 15" never
+    resolves to "Dell XPS 13".
+    """
+
+    def __init__(self, min_similarity=0.75, min_margin=0.1):
+        self.min_similarity = min_similarity
+        self.min_margin = min_margin
+        self.exact = {}                    # normalized name -> row
+        self.grams = defaultdict(set)      # trigram -> rows
+        self.gram_counts = {}              # row -> number of trigrams in its name
+        self.numbers = {}                  # row -> numeric tokens in its name
+
+    @classmethod
+    def from_table(cls, product_table, **kwargs):
+        index = cls(**kwargs)
+        for row, name in enumerate(product_table.names):
+            index.add(row, name)
+        return index
+
+    def add(self, row, name):
+        key = normalize(name)
+        if not key:
+            return
+        self.exact.setdefault(key, row)
+        name_grams = trigrams(key)
+        for gram in name_grams:
+            self.grams[gram].add(row)
+        self.gram_counts[row] = len(name_grams)
+        self.numbers[row] = numbers(key)
+
+    def match(self, query):
+        """Row of the product the query confidently names, or None."""
+        key = normalize(query)
+        if not key:
+            return None
+        row = self.exact.get(key)
+        if row is not None:
+            return row
+
+        # A product name mentioned inside a longer request, e.g. "add the macbook air m2 please".
+        # A name inside a longer mentioned name doesn't count, so "iphone 14 pro" is not also "iphone 14";
+        # a request that mentions two products, "ps5 or xbox series x", names neither.
+        words = key.split()
+        spans = [(i, i + length, self.exact[span])
+                 for length in range(min(len(words), MAX_NAME_WORDS), 0, -1)
+                 for i, span in ((i, ' '.join(words[i:i + length])) for i in range(len(words) - length + 1))
+                 if span in self.exact]
+        mentioned = {row for start, end, row in spans
+                     if not any(s <= start and end <= e and e - s > end - start for s, e, _ in spans)}
+        if len(mentioned) == 1:
+            return mentioned.pop()
+        if mentioned:
+            return None
+
+        query_grams = trigrams(key)
+        shared = defaultdict(int)
+        for gram in query_grams:
+            for row in self.grams.get(gram, ()):
+                shared[row] += 1
+        if not shared:
+            return None
+        scores = sorted(
+            ((2 * count / (len(query_grams) + self.gram_counts[row]), row) for row, count in shared.items()),
+            reverse=True,
+        )
+        best_score, best_row = scores[0]
+        runner_up = scores[1][0] if len(scores) > 1 else 0.0
+        if best_score < self.min_similarity or best_score - runner_up < self.min_margin:
+            return None
+        # Names that differ only in a number are different products; leave those to hybrid search
+        if numbers(key) != self.numbers[best_row]:
+            return None
+        return best_row
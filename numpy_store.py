@@ -0,0 +1,139 @@
+import os
+import pickle
+
+import numpy as np
+from langchain.schema import Document
+
+
+class NumpyVectorStore:
+    """
+    In-memory vector store for catalogs that fit in RAM.
+    L2-normalized float32 embeddings live in one contiguous matrix, so a query is a single
+    matrix-vector product plus argpartition, and a batch of queries is one matrix-matrix product.
+    Implements the parts of the Chroma interface the app uses (get, add_documents, delete,
+    similarity_search, persist). The matrix is saved as a .npy file that can be memory-mapped on load.
+    """
+
+    def __init__(self, embedding_function, persist_directory=None, mmap_mode=None):
+        self.embedding_function = embedding_function
+        self.persist_directory = persist_directory
+        self.ids = []
+        self.texts = []
+        self.metadatas = []
+        self.rows = {}         # ID -> row
+        self.matrix = None     # Rows beyond len(ids) are spare capacity
+        if persist_directory and os.path.exists(self._meta_path()):
+            self.load(mmap_mode=mmap_mode)
+
+    def _vectors_path(self):
+        return os.path.join(self.persist_directory, 'vectors.npy')
+
+    def _meta_path(self):
+        return os.path.join(self.persist_directory, 'meta.pkl')
+
+    def __len__(self):
+        return len(self.ids)
+
+    @staticmethod
+    def _normalize(vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+    def _writable(self, capacity):
+        """Make sure the matrix is an in-memory array with room for capacity rows."""
+        if self.matrix is None:
+            return
+        if isinstance(self.matrix, np.memmap) or capacity > self.matrix.shape[0]:
+            grown = np.empty((max(capacity, 2 * len(self)), self.matrix.shape[1]), dtype=np.float32)
+            grown[:len(self)] = self.matrix[:len(self)]
+            self.matrix = grown
+
+    def get(self, include=None):
+        result = {'ids': list(self.ids)}
+        if include and 'documents' in include:
+            result['documents'] = list(self.texts)
+        return result
+
+    def add_documents(self, documents, ids):
+        if not documents:
+            return []
+        vectors = self._normalize(self.embedding_function.embed_documents([doc.page_content for doc in documents]))
+        if self.matrix is None:
+            self.matrix = np.empty((len(vectors), vectors.shape[1]), dtype=np.float32)
+        self._writable(len(self) + len(vectors))
+        for doc, doc_id, vector in zip(documents, ids, vectors):
+            row = self.rows.get(doc_id)
+            if row is None:
+                row = len(self.ids)
+                self.ids.append(doc_id)
+                self.texts.append(doc.page_content)
+                self.metadatas.append(doc.metadata)
+                self.rows[doc_id] = row
+            self.matrix[row] = vector
+        return list(ids)
+
+    def delete(self, ids):
+        """Delete by swapping the last row into the freed slot, keeping the matrix contiguous."""
+        self._writable(len(self))
+        for doc_id in ids:
+            row = self.rows.pop(doc_id, None)
+            if row is None:
+                continue
+            last = len(self.ids) - 1
+            if row != last:
+                self.matrix[row] = self.matrix[last]
+                self.ids[row] = self.ids[last]
+                self.texts[row] = self.texts[last]
+                self.metadatas[row] = self.metadatas[last]
+                self.rows[self.ids[row]] = row
+            self.ids.pop()
+            self.texts.pop()
+            self.metadatas.pop()
+
+    def _top_k(self, scores, k):
+        if k < len(scores):
+            top = np.argpartition(-scores, k)[:k]
+        else:
+            top = np.arange(len(scores))
+        return top[np.argsort(-scores[top])]
+
+    def _documents(self, rows):
+        return [Document(page_content=self.texts[row], metadata=self.metadatas[row]) for row in rows]
+
+    def similarity_search(self, query, k=4):
+        if not self.ids:
+            return []
+        query_vector = self._normalize(self.embedding_function.embed_query(query))
+        scores = self.matrix[:len(self)] @ query_vector
+        return self._documents(self._top_k(scores, k))
+
+    def similarity_search_batch(self, queries, k=4):
+        """Search several queries at once. Returns one list of Documents per query."""
+        if not self.ids:
+            return [[] for _ in queries]
+        query_vectors = self._normalize([self.embedding_function.embed_query(query) for query in queries])
+        scores = query_vectors @ self.matrix[:len(self)].T
+        return [self._documents(self._top_k(row_scores, k)) for row_scores in scores]
+
+    def persist(self):
+        if not self.persist_directory:
+            return
+        os.makedirs(self.persist_directory, exist_ok=True)
+        matrix = self.matrix[:len(self)] if self.matrix is not None else np.empty((0, 0), dtype=np.float32)
+        tmp_path = self._vectors_path() + '.tmp.npy'
+        np.save(tmp_path, np.ascontiguousarray(matrix))
+        os.replace(tmp_path, self._vectors_path())
+        tmp_path = self._meta_path() + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            pickle.dump({'ids': self.ids, 'texts': self.texts, 'metadatas': self.metadatas}, f,
+                        protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self._meta_path())
+
+    def load(self, mmap_mode=None):
+        """Load the saved index. mmap_mode='r' maps the matrix read-only instead of reading it into memory."""
+        with open(self._meta_path(), 'rb') as f:
+            meta = pickle.load(f)
+        self.ids, self.texts, self.metadatas = meta['ids'], meta['texts'], meta['metadatas']
+        self.rows = {doc_id: row for row, doc_id in enumerate(self.ids)}
+        self.matrix = np.load(self._vectors_path(), mmap_mode=mmap_mode) if self.ids else None
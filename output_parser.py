@@ -1,14 +1,21 @@
-from pydantic import BaseModel
-from langchain.output_parsers import PydanticOutputParser
+from langchain.agents.conversational.output_parser import ConvoOutputParser
+from prompts import AI_PREFIX
+from tracing import span
 
-# Define the structure of the agent's output
-class AgentOutput(BaseModel):
-    thought: str
-    final_answer: str
 
-# Custom Pydantic output parser
+class TracedConvoOutputParser(ConvoOutputParser):
+    """ConvoOutputParser that times every parse as the 'parse' stage."""
+
+    def parse(self, text):
+        with span("parse"):
+            return super().parse(text)
+
+
+# Parser for the conversational ReAct format the prompt asks for
 def get_output_parser():
-    return PydanticOutputParser(
-        pydantic_object=AgentOutput,
-        exception_handler=lambda e: f"Parsing error encountered: {str(e)}",
-    )
+    return TracedConvoOutputParser(ai_prefix=AI_PREFIX)
+
+
+# Sent back to the LLM as the observation when its output can't be parsed
+def handle_parsing_error(error):
+    return f"Parsing error encountered: {str(error)}"
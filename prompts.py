@@ -1,7 +1,46 @@
-from langchain.prompts import PromptTemplate
+from functools import lru_cache
 
-def get_context_prompt():
-    prompt = """
+import numpy as np
+from langchain.agents import ConversationalAgent
+from langchain.prompts import PromptTemplate, FewShotPromptTemplate
+from langchain_core.example_selectors import BaseExampleSelector
+from embedding_cache import get_embedding_function
+
+AI_PREFIX = "AI"
+
+INSTRUCTIONS = """Instructions:
+1. Greet the user and engage them.
+2. You are a friendly bot designed to assist customers with questions about an electronic store related topics only.
+3. When the user asks any questions out of context you should tell in a friendly way that you don't have an idea about this topic.
+4. If questions contain harmful or inappropriate content, politely inform the user that you cannot assist with such inquiries.
+5. Tool Usage:
+ - Use the Add to Cart tool when the user requests to add an item to the cart.
+ - After using the Make an Order tool and returning the string summarizing the order, ask the user for their home address
+   and then tell them in a friendly way that the order will be shipped to the address they provided.
+
+You have access to the following tools:"""
+
+FORMAT_INSTRUCTIONS = """To use a tool, use the following format:
+
+Thought: Do I need to use a tool? Yes
+Action: the action to take, should be one of [{tool_names}]
+Action Input: the input to the action
+Observation: the result of the action
+
+When you have a response for the user, or if you do not need to use a tool, you MUST use the format:
+
+Thought: Do I need to use a tool? No
+{ai_prefix}: your response here"""
+
+SUFFIX = """Previous conversation history:
+{chat_history}
+
+New input: {input}
+{agent_scratchpad}"""
+
+# The prompt text the agent started from, before the compact prefix and example selection.
+# Kept only so the token report can count the original prompt.
+ORIGINAL_PROMPT = """
     Instructions:
     1. Greet the user and engage them.
     2. You are a friendly bot designed to assist customers with questions about an electronic store related topics only.
@@ -60,5 +99,136 @@ def get_context_prompt():
     Question: {input}
     {agent_scratchpad}
     """
-    
-    return PromptTemplate(template=prompt, input_variables=['input'])
+
+# Example bank. Only the examples closest to the user's message are sent with each step.
+EXAMPLES = [
+    {
+        "input": "Hello",
+        "output": "Thought: Do I need to use a tool? No\nAI: Hello, how can I assist you today!",
+    },
+    {
+        "input": "Can you help me with my homework",
+        "output": "Thought: Do I need to use a tool? No\n"
+                  "AI: Sorry but I can't help you with that, the only thing I can help with is electronic products.",
+    },
+    {
+        "input": "Do you have any gaming laptops?",
+        "output": "Thought: Do I need to use a tool? Yes\nAction: Search for Electronic Products\n"
+                  "Action Input: gaming laptop",
+    },
+    {
+        "input": "I want to add this laptop to the cart",
+        "output": "Thought: Do I need to use a tool? Yes\nAction: Add to Cart\nAction Input: Dell XPS 13",
+    },
+    {
+        "input": "What is the total price of the order",
+        "output": "Thought: Do I need to use a tool? Yes\nAction: Calculate Total Price\nAction Input: None",
+    },
+    {
+        "input": "I'd like to place my order",
+        "output": "Thought: Do I need to use a tool? Yes\nAction: Make an Order\nAction Input: None",
+    },
+]
+
+EXAMPLE_PROMPT = PromptTemplate(
+    input_variables=["input", "output"],
+    template="Example:\nUser input: {input}\n{output}",
+)
+
+
+class SimilarExampleSelector(BaseExampleSelector):
+    """Picks the k examples whose inputs are most similar to the user's message, by embedding cosine similarity."""
+
+    def __init__(self, examples, k=2):
+        self.examples = list(examples)
+        self.k = k
+        self.vectors = None
+
+    def _example_vectors(self):
+        if self.vectors is None:
+            vectors = np.asarray(get_embedding_function().embed_documents([ex["input"] for ex in self.examples]),
+                                 dtype=np.float32)
+            self.vectors = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+        return self.vectors
+
+    def add_example(self, example):
+        self.examples.append(example)
+        self.vectors = None
+
+    def warm(self):
+        """Embed the example bank now rather than on the first turn."""
+        self._example_vectors()
+
+    def select_examples(self, input_variables):
+        vectors = self._example_vectors()
+        query = np.asarray(get_embedding_function().embed_query(input_variables["input"]), dtype=np.float32)
+        scores = vectors @ (query / np.linalg.norm(query))
+        return [self.examples[i] for i in np.argsort(-scores)[:self.k]]
+
+
+def render_prefix(tool_descriptions):
+    """The static part of the prompt: instructions, tools and output format."""
+    tool_strings = "\n".join(f"> {name}: {description}" for name, description in tool_descriptions)
+    tool_names = ", ".join(name for name, _ in tool_descriptions)
+    format_instructions = FORMAT_INSTRUCTIONS.format(tool_names=tool_names, ai_prefix=AI_PREFIX)
+    # The prefix goes through the template engine again, so keep literal braces intact
+    return "\n\n".join([INSTRUCTIONS, tool_strings, format_instructions]).replace("{", "{{").replace("}", "}}")
+
+
+@lru_cache(maxsize=None)
+def _build_prompt(tool_descriptions, example_selector):
+    return FewShotPromptTemplate(
+        example_selector=example_selector,
+        example_prompt=EXAMPLE_PROMPT,
+        prefix=render_prefix(tool_descriptions),
+        suffix=SUFFIX,
+        input_variables=["input", "chat_history", "agent_scratchpad"],
+        example_separator="\n\n",
+    )
+
+
+_similar_examples = SimilarExampleSelector(EXAMPLES, k=2)
+
+
+def warm_example_selector():
+    """Embed the shared example bank, e.g. before forking so workers share the vectors."""
+    _similar_examples.warm()
+
+
+def get_context_prompt(tools):
+    """
+    The agent prompt for the given tools. The static prefix is rendered once per tool set and shared
+    by every session; each step adds only the examples closest to the user's message.
+    """
+    return _build_prompt(tuple((tool.name, tool.description) for tool in tools), _similar_examples)
+
+
+def prompt_token_report(tools, queries, count_tokens):
+    """
+    Prompt tokens per agent step (without history and scratchpad) with the original prompt, i.e.
+    ORIGINAL_PROMPT on top of LangChain's default ConversationalAgent prompt, versus the compact
+    prefix with the selected examples. Returns a list of (query, tokens before, tokens after).
+    """
+    default = ConversationalAgent.create_prompt(tools, ai_prefix=AI_PREFIX)
+    tool_strings = "\n".join(f"> {tool.name}: {tool.description}" for tool in tools)
+    after = get_context_prompt(tools)
+    rows = []
+    for query in queries:
+        variables = {"input": query, "chat_history": "", "agent_scratchpad": ""}
+        before = (ORIGINAL_PROMPT.format(tools=tool_strings, input=query, agent_scratchpad="")
+                  + default.format(**variables))
+        rows.append((query, count_tokens(before), count_tokens(after.format(**variables))))
+    return rows
+
+if __name__ == '__main__':
+    # Prompt tokens per step, before and after example selection: python prompts.py "query" ...
+    # Counts with the configured model; LLM_BACKEND=fake estimates offline, without a tokenizer download.
+    import sys
+    from llm import get_llm
+    from tools import get_tools
+
+    queries = sys.argv[1:] or [example["input"] for example in EXAMPLES]
+    count_tokens = get_llm().get_num_tokens
+    print("before   after  query")
+    for query, before, after in prompt_token_report(get_tools(None, None, None), queries, count_tokens):
+        print(f"{before:6d}  {after:6d}  {query}")
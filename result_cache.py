@@ -0,0 +1,56 @@
+import time
+import threading
+from collections import OrderedDict
+
+from config import result_cache_size, result_cache_ttl
+
+
+class ResultCache:
+    """
+    Process-wide cache of retrieval results with TTL and LRU size eviction.
+    Every entry belongs to a catalog version; when the version changes the whole cache is dropped,
+    so results from an older catalog or index are never served.
+    """
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = OrderedDict()   # key -> (expiry time, value)
+        self.version = None
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _check_version(self, version):
+        if version != self.version:
+            self.entries.clear()
+            self.version = version
+
+    def get(self, key, version):
+        """Cached value for key, or None."""
+        with self.lock:
+            self._check_version(version)
+            entry = self.entries.get(key)
+            if entry is not None:
+                expiry, value = entry
+                if expiry > time.monotonic():
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self.entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, version, value):
+        with self.lock:
+            self._check_version(version)
+            self.entries[key] = (time.monotonic() + self.ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def stats(self):
+        return {'size': len(self.entries), 'hits': self.hits, 'misses': self.misses}
+
+
+result_cache = ResultCache(result_cache_size, result_cache_ttl)
@@ -0,0 +1,152 @@
+import os
+from itertools import chain
+from config import csv_file
+from doc_creator import product_id, create_documents, parse_content
+from catalog import (ProductTable, catalog_version, bump_catalog_version, read_snapshot, snapshot_sources,
+                     snapshot_is_current, save_snapshot)
+from data_loading import load_data
+from name_index import NameIndex
+from embedding_cache import QueryCachedEmbeddings
+from result_cache import result_cache
+from tracing import span, count
+from lexical_index import lexical_text
+from vector_store import sync_documents, get_vector_store, get_lexical_index, snapshot_path
+
+
+class ProductRetriever:
+    """
+    Resolves product queries to rows of the product table.
+    Queries that plainly name a product are answered from the name index without touching the
+    embedding model. Everything else runs both vector search and BM25 lexical search, whose
+    rankings are combined with reciprocal rank fusion, so exact model numbers and SKUs still win.
+    Results are kept in the process-wide result cache, keyed on the normalized query, k and the
+    catalog version.
+    """
+
+    def __init__(self, vector_store, product_table, name_index, lexical_index, candidates=10, rrf_k=60):
+        self.vector_store = vector_store
+        self.product_table = product_table
+        self.name_index = name_index
+        self.lexical_index = lexical_index
+        self.candidates = candidates
+        self.rrf_k = rrf_k
+
+    def vector_search(self, query, k):
+        rows = []
+        with span("vector_search"):
+            results = self.vector_store.similarity_search(query, k=k)
+        for result in results:
+            row = self.product_table.row(result.metadata.get('product_id') or product_id(result.page_content))
+            if row is not None:
+                rows.append(row)
+        return rows
+
+    def lexical_search(self, query, k):
+        rows = []
+        with span("lexical_search"):
+            hits = self.lexical_index.search(query, k)
+        for doc_id, _ in hits:
+            row = self.product_table.row(doc_id)
+            if row is not None:
+                rows.append(row)
+        return rows
+
+    def hybrid_search(self, query, k):
+        """Fuse the vector and lexical rankings: each list adds 1 / (rrf_k + rank) to a product's score."""
+        n = max(k, self.candidates)
+        scores = {}
+        for ranking in (self.vector_search(query, n), self.lexical_search(query, n)):
+            for rank, row in enumerate(ranking, start=1):
+                scores[row] = scores.get(row, 0.0) + 1 / (self.rrf_k + rank)
+        return sorted(scores, key=scores.get, reverse=True)[:k]
+
+    def find(self, query, k=1):
+        """Rows of the top k products for a query, best first."""
+        key = (QueryCachedEmbeddings.normalize(query), k)
+        version = catalog_version()
+        rows = result_cache.get(key, version)
+        if rows is not None:
+            count("search_result_cache", "hit")
+            return list(rows)
+        count("search_result_cache", "miss")
+
+        with span("search"):
+            row = self.name_index.match(query)
+            if row is None:
+                rows = self.hybrid_search(query, k)
+            elif k == 1:
+                rows = [row]
+            else:
+                rows = [row] + [other for other in self.hybrid_search(query, k) if other != row][:k - 1]
+        result_cache.put(key, version, tuple(rows))
+        return rows
+
+
+def table_from_store(vector_store, lexical_index):
+    """
+    Rebuild the product table from the documents in the vector store, without touching the store,
+    and bring the lexical index in line with them, saving it if it changed.
+    Returns None if the store holds IDs that are not content hashes, as stores written before
+    products had stable IDs do: those have to be re-synced.
+    """
+    product_table = ProductTable()
+    stored = vector_store.get(include=['documents'])
+    for doc_id, content in zip(stored['ids'], stored['documents']):
+        if doc_id != product_id(content):
+            return None
+        product_table.add(doc_id, parse_content(content))
+
+    changed = False
+    for doc_id, content in zip(stored['ids'], stored['documents']):
+        if doc_id not in lexical_index:
+            lexical_index.add(doc_id, lexical_text(content))
+            changed = True
+    for doc_id in set(lexical_index.doc_lengths) - set(stored['ids']):
+        lexical_index.remove(doc_id)
+        changed = True
+    if changed:
+        lexical_index.save()
+    return product_table
+
+
+def load_retriever(read_only=False, reindex=False):
+    """
+    Retriever over the saved catalog.
+    Starts from the snapshot written at ingest time when it is current. A stale snapshot is rebuilt
+    by re-syncing the indexes against all of the files it was built from. Without a usable snapshot,
+    an existing index is opened as it is, since it may hold products from other files, unless it
+    predates stable product IDs; that one, like an empty index, is built from config.csv_file.
+    reindex re-syncs against config.csv_file only, which removes every product not in it.
+    """
+    snapshot = None if reindex else read_snapshot(snapshot_path())
+    lexical_index = get_lexical_index()
+    vector_store = get_vector_store(read_only=read_only)
+
+    if snapshot is not None and snapshot_is_current(snapshot):
+        product_table = snapshot['table']
+        bump_catalog_version()
+        print(f"Loaded {len(product_table)} products from the catalog snapshot.")
+        return ProductRetriever(vector_store, product_table, NameIndex.from_table(product_table), lexical_index)
+
+    sources = snapshot_sources(snapshot) if snapshot is not None else []
+    missing = [source for source in sources if not os.path.exists(source)]
+    product_table = None
+    if missing or (snapshot is None and not reindex and vector_store.get(include=[])['ids']):
+        product_table = table_from_store(vector_store, lexical_index)
+        if product_table is None:
+            print(f"The existing index has products without stable IDs: re-indexing it from {csv_file}.")
+            sources = [csv_file]
+        elif missing:
+            print(f"Catalog sources {missing} are gone: using the existing index as it is. "
+                  f"Run ingest.py to refresh it.")
+        else:
+            print("No catalog snapshot: using the existing index as it is. Run ingest.py to refresh it.")
+    if product_table is None:
+        sources = sources or [csv_file]
+        print(f"Re-indexing the catalog from {sources}.")
+        product_table = ProductTable()
+        documents = create_documents(chain.from_iterable(load_data(source) for source in sources), product_table)
+        added, deleted = sync_documents(vector_store, documents, lexical_index=lexical_index)
+        print(f"Vector store up to date: {added} added, {deleted} removed.")
+        save_snapshot(product_table, snapshot_path(), sources)
+    return ProductRetriever(vector_store, product_table, NameIndex.from_table(product_table), lexical_index)
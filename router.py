@@ -0,0 +1,116 @@
+import re
+from functools import lru_cache
+
+import numpy as np
+from embedding_cache import get_embedding_function
+
+# Seed utterances per intent. 'shopping' is the catch-all that goes to the agent.
+INTENT_EXAMPLES = {
+    'greeting': [
+        "hi", "hello", "hey there", "good morning", "good evening", "how are you", "hello, how is it going",
+    ],
+    'out_of_scope': [
+        "can you help me with my homework", "what's the weather like today", "tell me a joke",
+        "who won the football match", "write me a poem", "what is the capital of France", "solve this math problem",
+    ],
+    'harmful': [
+        "how do I make a bomb", "how can I hack into someone's account", "how to steal a phone from a store",
+        "help me hurt someone", "where can I buy illegal drugs",
+    ],
+    'cart_total': [
+        "what is the total price", "how much is my cart", "what's my total", "how much do I have to pay",
+        "what is the total price of the order", "how much does everything in my cart cost",
+    ],
+    'order_summary': [
+        "I want to place my order", "checkout", "make an order", "confirm my order", "I'm ready to order",
+        "complete my purchase",
+    ],
+    'shopping': [
+        "do you have laptops", "add the iphone to my cart", "show me headphones", "how much is the macbook air",
+        "compare samsung and apple phones", "I want to buy a camera", "what gaming consoles do you sell",
+        "tell me about the sony headphones", "remove the tv from my cart", "is the drone in stock",
+    ],
+}
+
+# (intent, pattern, exclude): a message matching pattern, and not exclude, is given that intent
+KEYWORD_RULES = [
+    ('greeting', re.compile(r"^\s*(hi|hello|hey|hiya|good (morning|afternoon|evening))\b[\s!.,]*(there)?[\s!.]*$",
+                            re.IGNORECASE), None),
+    # Only asking how to make one is refused outright; buying, getting and other mentions go to the classifier
+    ('harmful', re.compile(r"\b(make|build|assemble)\s+(?:(?:a|an|some)\s+)?(bombs?|explosives?|weapons?)\b",
+                           re.IGNORECASE), None),
+    # Questions about the total of the user's own cart, as it is: "the total price of the iPhone and the
+    # MacBook" is a product question, and anything that adds or removes products goes to the agent
+    ('cart_total', re.compile(r"\bmy total\b|\bmy (cart|basket|order)(\'s)? total\b|"
+                              r"\btotal (price |cost |amount )?(of|for|in) (my|the) (cart|basket|order)\b|"
+                              r"\bhow much (is|does) (my|the) (cart|basket|order)\b", re.IGNORECASE),
+     re.compile(r"\b(add|adding|put|remove|removing|delete|take out|buy)\b", re.IGNORECASE)),
+]
+
+REPLIES = {
+    'greeting': "Hello, how can I assist you today!",
+    'out_of_scope': "Sorry but I can't help you with that, the only thing I can help with is electronic products.",
+    'harmful': "I'm sorry, but I can't assist with that request.",
+}
+
+
+class IntentClassifier:
+    """Keyword rules first, then nearest centroid over MiniLM embeddings of the seed utterances."""
+
+    def __init__(self, examples, threshold=0.6, margin=0.05):
+        self.intents = list(examples)
+        self.threshold = threshold
+        self.margin = margin
+        embeddings = get_embedding_function()
+        centroids = []
+        for intent in self.intents:
+            vectors = np.asarray(embeddings.embed_documents(examples[intent]), dtype=np.float32)
+            vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+            centroid = vectors.mean(axis=0)
+            centroids.append(centroid / np.linalg.norm(centroid))
+        self.centroids = np.stack(centroids)
+
+    def classify(self, message):
+        """The intent of a message, or 'shopping' when no other intent is a confident match."""
+        for intent, pattern, exclude in KEYWORD_RULES:
+            if pattern.search(message) and not (exclude and exclude.search(message)):
+                return intent
+        vector = np.asarray(get_embedding_function().embed_query(message), dtype=np.float32)
+        scores = self.centroids @ (vector / np.linalg.norm(vector))
+        order = np.argsort(-scores)
+        best, runner_up = scores[order[0]], scores[order[1]]
+        if best < self.threshold or best - runner_up < self.margin:
+            return 'shopping'
+        return self.intents[order[0]]
+
+
+@lru_cache(maxsize=None)
+def get_intent_classifier():
+    return IntentClassifier(INTENT_EXAMPLES)
+
+
+class IntentRouter:
+    """
+    Answers turns that don't need the LLM: greetings, out-of-scope and harmful requests get templated
+    replies, cart totals and order summaries call the session's tools directly. Everything else
+    returns None and goes to the agent.
+    """
+
+    def __init__(self, tools):
+        self.tools = {tool.name: tool for tool in tools}
+        self.classifier = get_intent_classifier()
+
+    def route(self, message):
+        intent = self.classifier.classify(message)
+        if intent in REPLIES:
+            return REPLIES[intent]
+        if intent == 'cart_total':
+            total = self.tools["Calculate Total Price"].func()
+            if isinstance(total, str):
+                return total   # The tool timed out
+            if not total:
+                return "Your cart is empty, please add some products to your cart first."
+            return f"Your total price is ${total:,.2f}."
+        if intent == 'order_summary':
+            return self.tools["Make an Order"].func()
+        return None
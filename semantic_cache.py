@@ -0,0 +1,117 @@
+import re
+import threading
+
+import numpy as np
+from catalog import catalog_version
+from name_index import normalize, numbers
+from tracing import count
+
+# Messages that refer to the cart, the order or earlier turns can't be answered from another session's reply
+STATEFUL_PATTERN = re.compile(
+    r"\b(cart|order|orders|total|buy|add|added|remove|checkout|address|ship|shipping|my|mine|it|this|that|"
+    r"these|those|them|one|again|previous|last)\b",
+    re.IGNORECASE,
+)
+
+# Tools whose result does not depend on the session
+STATELESS_TOOLS = {"Search for Electronic Products"}
+
+
+def is_stateless(message):
+    return not STATEFUL_PATTERN.search(message)
+
+
+class SemanticResponseCache:
+    """
+    Process-wide cache of agent answers to stateless questions, looked up by embedding similarity.
+    A message whose embedding is within the cosine threshold of a cached question gets the cached
+    answer without running the agent, provided both mention the same numbers, so a question about
+    the iPhone 14 is never answered with the iPhone 13's reply. Entries are dropped when the
+    catalog version changes.
+    Hits, misses, bypasses and the agent time saved by hits are counted, and exported as the
+    response_cache and response_cache_saved_seconds metrics.
+    """
+
+    def __init__(self, embeddings, threshold=0.92, max_size=1000):
+        self.embeddings = embeddings
+        self.threshold = threshold
+        self.max_size = max_size
+        self.vectors = None            # Ring buffer of normalized question embeddings
+        self.answers = [None] * max_size
+        self.latencies = [0.0] * max_size
+        self.numbers = [None] * max_size   # Numeric tokens of each cached question
+        self.size = 0
+        self.next_slot = 0
+        self.version = catalog_version()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self.saved_seconds = 0.0
+
+    def _embed(self, message):
+        vector = np.asarray(self.embeddings.embed_query(message), dtype=np.float32)
+        return vector / max(np.linalg.norm(vector), 1e-12)
+
+    def _check_version(self):
+        version = catalog_version()
+        if version != self.version:
+            self.size = 0
+            self.next_slot = 0
+            self.version = version
+
+    def lookup(self, message):
+        """Cached answer for a message, or None."""
+        if not is_stateless(message):
+            with self.lock:
+                self.bypassed += 1
+            count("response_cache", "bypassed")
+            return None
+        vector = self._embed(message)
+        message_numbers = numbers(normalize(message))
+        with self.lock:
+            self._check_version()
+            if self.size:
+                scores = self.vectors[:self.size] @ vector
+                close = np.flatnonzero(scores >= self.threshold)
+                best = next((int(slot) for slot in close[np.argsort(-scores[close])]
+                             if self.numbers[slot] == message_numbers), None)
+                if best is not None:
+                    self.hits += 1
+                    saved = self.latencies[best]
+                    self.saved_seconds += saved
+                    answer = self.answers[best]
+                    count("response_cache", "hit")
+                    count("response_cache_saved_seconds", amount=saved)
+                    return answer
+            self.misses += 1
+        count("response_cache", "miss")
+        return None
+
+    def store(self, message, answer, latency, tools_used):
+        """Remember an agent answer if neither the message nor the tools it used depend on session state."""
+        if not is_stateless(message) or not set(tools_used) <= STATELESS_TOOLS:
+            return
+        vector = self._embed(message)
+        with self.lock:
+            self._check_version()
+            if self.vectors is None:
+                self.vectors = np.zeros((self.max_size, len(vector)), dtype=np.float32)
+            slot = self.next_slot
+            self.vectors[slot] = vector
+            self.answers[slot] = answer
+            self.latencies[slot] = latency
+            self.numbers[slot] = numbers(normalize(message))
+            self.next_slot = (slot + 1) % self.max_size
+            self.size = min(self.size + 1, self.max_size)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'size': self.size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'bypassed': self.bypassed,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'saved_seconds': self.saved_seconds,
+        }
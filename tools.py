@@ -1,9 +1,44 @@
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
 from langchain.agents import Tool
+from catalog import format_price
+from config import tool_timeout
+from tracing import traced, count
+
+_tool_pool = ThreadPoolExecutor(max_workers=32, thread_name_prefix="tool")
+
+
+def with_timeout(func, timeout=tool_timeout):
+    """
+    Wrap a tool function so a call that runs longer than timeout seconds returns an error message instead.
+    Only the tool's own run is timed. A call still waiting for a free thread after timeout seconds is
+    cancelled before it starts, so it can't take effect later. Functions that change state should
+    only wrap their read-only part, so a timed-out call never changes anything afterwards.
+    The call runs in the caller's context, so it is traced as part of the caller's turn.
+    """
+    def run(*args, **kwargs):
+        started = threading.Event()
+        context = contextvars.copy_context()
+
+        def call():
+            started.set()
+            return context.run(func, *args, **kwargs)
+
+        future = _tool_pool.submit(call)
+        if not started.wait(timeout) and future.cancel():
+            count("tool_timeouts", "queued")
+            return "The store is busy right now, please try again in a moment."
+        try:
+            return future.result(timeout=timeout)
+        except TimeoutError:
+            count("tool_timeouts", "running")
+            return "The tool took too long to respond, please try again."
+    return run
 
-cart = []
 
 # Tool 1 : Search Electronic Products
-def search_electronic_products(query, vector_store, k=1):
+def search_electronic_products(query, retriever, k=1):
     """
     Search for electronic products and return results as a list of dictionaries.
     Arguments:
@@ -15,118 +50,108 @@ def search_electronic_products(query, vector_store, k=1):
     if not query or type(query) != str:
         return "Please provide a valid product name to search for."
     try:
-        results = vector_store.similarity_search(query, k=k)
-        if not results:
-            return []
-
-        product_details_list = []
-        for result in results:
-            lines = result.page_content.split("\n")
-            content_dict = {}
-            for line in lines:
-                if ": " in line:
-                    key, value = line.split(": ", 1)
-                    content_dict[key.strip()] = value.strip()
-            required_keys = ['Category', 'Product', 'Price', 'Description']
-            if all(key in content_dict for key in required_keys):
-                product_details_list.append(content_dict)
-        return product_details_list
+        return [retriever.product_table.record(row) for row in retriever.find(query, k=k)]
     except Exception as e:
         return f"An unexpected error occurred during the search: {e}"
 
 
 # Tool 2 : Add to Cart
-def add_to_cart(product_name, vector_store):
+def add_to_cart(product_name, retriever, cart, find=None):
     """
     Add multiple products to the cart after searching for it.
     Arguments:
         product_name (str): The name of the product to add to the cart.
+        find (callable): Looks up the rows for a product name, by default retriever.find with k=1.
     Returns:
         str: A message telling whether the product was added or not.
     """
-    search_results = search_electronic_products(product_name, vector_store, k=1)
-    if isinstance(search_results, str):  # Check if it's an error message
-        return search_results
+    if not product_name or type(product_name) != str:
+        return "Please provide a valid product name to search for."
+    try:
+        rows = find(product_name) if find else retriever.find(product_name, k=1)
+    except Exception as e:
+        return f"An unexpected error occurred during the search: {e}"
+    if isinstance(rows, str):
+        return rows   # The lookup timed out
 
-    if not search_results:
+    if not rows:
         return f"Sorry, I couldn't find '{product_name}'."
 
-    product_details = search_results[0]
-    for item in cart:
-        if item['Product'] == product_details.get('Product'):
-            return f"{product_details.get('Product', 'Unknown Product')} is already in your cart."
-
-    cart.append(product_details)
-    return f"{product_details.get('Product', 'Unknown Product')} has been added to your cart."
+    row = rows[0]
+    product_table = retriever.product_table
+    name = product_table.names[row]
+    product_id = product_table.ids[row]
+    with cart.lock:
+        if product_id in cart:
+            return f"{name} is already in your cart."
+        cart.add(product_id, row, product_table.prices[row])
+    return f"{name} has been added to your cart."
 
 
 # Tool 3 : Calculate Total Price
-def calculate_total_price(input_str=None):
+def calculate_total_price(product_table, cart, input_str=None):
     """
     Calculate the total price of items in the cart when products are added.
     Returns:
-    float: Total price of the products in the cart or an error message.
+    float: Total price of the products in the cart.
     """
-    try:
-        total_price = 0
-        for item in cart:
-            if isinstance(item, dict) and 'Price' in item:
-                price_str = item['Price']
-                price = price_str.replace('$', '').replace(',', '')
-                total_price += float(price)
-            else:
-                return f"Error: Unexpected item in cart: {item}"
-        return total_price
-    except (ValueError, KeyError) as e:
-        return f"Error: Invalid price format or missing data in the cart. {str(e)}"
+    return cart.total_cents / 100
 
 
 # Tool 4 : Make an Order
-def make_an_order(cart):
+def make_an_order(product_table, cart, input_str=None):
     """
     Create an order by summarizing the products in the cart.
     Returns:
     str: A string summarizing the order or informing if the cart is empty.
     """
-    if len(cart) == 0:
+    with cart.lock:
+        items = cart.items()
+        total_cents = cart.total_cents
+    if len(items) == 0:
         return "Your cart is empty, please add some products to your cart and come back again."
 
-    order_summary = "Your order contains the following products:\n"
-    for product in cart:
-        if isinstance(product, dict) and 'Product' in product and 'Price' in product:
-            order_summary += f"- {product['Product']} (Price: {product['Price']})\n"
-
-    total_price = calculate_total_price()
-    if isinstance(total_price, str):
-        return total_price
-
-    order_summary += f"\nTotal price: ${total_price:.2f}"
-    order_summary += "\n\nCould you please provide your shipping address to proceed with the order?"
-    return order_summary
+    lines = ["Your order contains the following products:"]
+    for row, price_cents, quantity in items:
+        line = f"- {product_table.names[row]} (Price: {format_price(price_cents)})"
+        lines.append(line if quantity == 1 else f"{line} x {quantity}")
+    lines.append(f"\nTotal price: {format_price(total_cents)}")
+    lines.append("\nCould you please provide your shipping address to proceed with the order?")
+    return "\n".join(lines)
 
 
 # Tool Definitions
-def get_tools(vector_store):
+def get_tools(retriever, cart_store, session_id):
+    """
+    Tools for one chat session. Cart tools look the session's cart up on every call, and every call has
+    a timeout. Add to Cart only times its product lookup: the cart change itself is short and always completes.
+    """
+    find_product = with_timeout(lambda product_name: retriever.find(product_name, k=1))
     return [
         Tool(
             name="Search for Electronic Products",
-            func=lambda query: search_electronic_products(query, vector_store),
+            func=with_timeout(traced("tool_search")(lambda query: search_electronic_products(query, retriever))),
             description="""Search for electronic products and return results as a list of dictionaries."""
         ),
         Tool(
             name="Add to Cart",
-            func=lambda product_name: add_to_cart(product_name, vector_store),
+            func=traced("tool_add_to_cart")(
+                lambda product_name: add_to_cart(product_name, retriever, cart_store.get(session_id), find_product)
+            ),
             description="""Add a product to the cart after searching for it."""
         ),
         Tool(
             name="Calculate Total Price",
-            func=calculate_total_price,
+            func=with_timeout(traced("tool_total")(
+                lambda input_str=None: calculate_total_price(retriever.product_table, cart_store.get(session_id), input_str)
+            )),
             description="""Calculate the total price of items in the cart."""
         ),
         Tool(
             name="Make an Order",
-            func=make_an_order,
+            func=with_timeout(traced("tool_order")(
+                lambda input_str=None: make_an_order(retriever.product_table, cart_store.get(session_id), input_str)
+            )),
             description="""Create an order summary with a list of product names and total price."""
         ),
     ]
-
@@ -0,0 +1,214 @@
+"""
+Per-turn timing spans and process-wide metrics.
+
+With tracing enabled (TRACING=1), span(stage) times a block of code: the duration goes into a
+histogram per stage and, inside a turn, into that turn's trace. Turns slower than trace_slow_turns
+print their trace as one JSON line. Histograms and counters are served in Prometheus text format
+on metrics_port. With tracing disabled, span() returns a shared no-op context manager, traced()
+returns the function unchanged and no callbacks are added.
+"""
+import json
+import time
+import bisect
+import threading
+import contextvars
+from contextlib import contextmanager, nullcontext
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from langchain_core.callbacks import BaseCallbackHandler
+from config import tracing_enabled, metrics_port, trace_slow_turns
+
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_noop = nullcontext()
+_current_trace = contextvars.ContextVar('current_trace', default=None)
+_lock = threading.Lock()
+_histograms = {}   # stage -> Histogram
+_counters = {}     # (event, label) -> count
+
+
+class Histogram:
+    """Cumulative-bucket histogram of durations in seconds, in the Prometheus layout."""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)   # The last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+def observe(stage, seconds):
+    """Record a stage duration in its histogram and in the current turn's trace."""
+    with _lock:
+        histogram = _histograms.get(stage)
+        if histogram is None:
+            histogram = _histograms[stage] = Histogram()
+        histogram.observe(seconds)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace['spans'].append((stage, round(time.perf_counter() - trace['start'] - seconds, 4), round(seconds, 4)))
+
+
+def count(event, label="", amount=1):
+    """Increment a counter, by amount (e.g. seconds) if given."""
+    if not tracing_enabled:
+        return
+    with _lock:
+        _counters[(event, label)] = _counters.get((event, label), 0) + amount
+
+
+@contextmanager
+def _span(stage):
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        count("errors", stage)
+        raise
+    finally:
+        observe(stage, time.perf_counter() - start)
+
+
+def span(stage):
+    """Context manager timing a block of code as stage. A shared no-op when tracing is disabled."""
+    return _span(stage) if tracing_enabled else _noop
+
+
+def traced(stage):
+    """Decorator timing every call of a function as stage. Leaves the function as is when tracing is disabled."""
+    def decorate(func):
+        if not tracing_enabled:
+            return func
+
+        def run(*args, **kwargs):
+            with _span(stage):
+                return func(*args, **kwargs)
+        return run
+    return decorate
+
+
+@contextmanager
+def turn(session_id):
+    """
+    Trace one chat turn: every span inside it, including on tool threads that copy the context,
+    is added to the turn's trace. The whole turn is timed as the 'turn' stage.
+    """
+    if not tracing_enabled:
+        yield
+        return
+    trace = {'session': session_id, 'start': time.perf_counter(), 'spans': []}
+    token = _current_trace.set(trace)
+    try:
+        with _span("turn"):
+            yield
+    finally:
+        _current_trace.reset(token)
+        elapsed = time.perf_counter() - trace['start']
+        if elapsed >= trace_slow_turns:
+            print(json.dumps({'slow_turn': round(elapsed, 4), 'session': session_id,
+                              'spans': [{'stage': s, 'offset': o, 'seconds': d} for s, o, d in trace['spans']]}))
+
+
+class TracingCallbackHandler(BaseCallbackHandler):
+    """Times every LLM call and its first token, and counts agent steps and tool calls."""
+    run_inline = True
+
+    def __init__(self):
+        self.started = {}   # run ID -> start time
+        self.first_token = set()
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self.started[run_id] = time.perf_counter()
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self.started[run_id] = time.perf_counter()
+
+    def on_llm_new_token(self, token, *, run_id, **kwargs):
+        if run_id not in self.first_token and run_id in self.started:
+            self.first_token.add(run_id)
+            observe("llm_first_token", time.perf_counter() - self.started[run_id])
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        self.first_token.discard(run_id)
+        start = self.started.pop(run_id, None)
+        if start is not None:
+            observe("llm", time.perf_counter() - start)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self.first_token.discard(run_id)
+        self.started.pop(run_id, None)
+        count("errors", "llm")
+
+    def on_agent_action(self, action, **kwargs):
+        count("agent_steps")
+        count("tool_calls", action.tool)
+
+
+def tracing_callbacks():
+    """Callback handlers to pass to the agent for one turn: none when tracing is disabled."""
+    return [TracingCallbackHandler()] if tracing_enabled else []
+
+
+def render_metrics():
+    """All histograms and counters in Prometheus text format."""
+    lines = ["# TYPE chatbot_stage_seconds histogram"]
+    with _lock:
+        for stage, histogram in sorted(_histograms.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(histogram.buckets + ('+Inf',), histogram.counts):
+                cumulative += bucket_count
+                lines.append(f'chatbot_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+            lines.append(f'chatbot_stage_seconds_sum{{stage="{stage}"}} {histogram.sum}')
+            lines.append(f'chatbot_stage_seconds_count{{stage="{stage}"}} {histogram.count}')
+        lines.append("# TYPE chatbot_events_total counter")
+        for (event, label), value in sorted(_counters.items()):
+            lines.append(f'chatbot_events_total{{event="{event}",label="{label}"}} {value}')
+    return "\n".join(lines) + "\n"
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path != '/metrics':
+            self.send_error(404)
+            return
+        body = render_metrics().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_metrics_server = None
+
+
+def start_metrics_server(port=metrics_port, attempts=1):
+    """
+    Serve /metrics on a daemon thread, once per process. Tries attempts consecutive ports, so each
+    forked worker can get its own. Returns the port, or None if tracing is disabled or no port was free.
+    """
+    global _metrics_server
+    if not tracing_enabled:
+        return None
+    with _lock:
+        if _metrics_server is None:
+            for candidate in range(port, port + attempts):
+                try:
+                    _metrics_server = ThreadingHTTPServer(('127.0.0.1', candidate), MetricsHandler)
+                    break
+                except OSError:
+                    continue
+            else:
+                print(f"Could not start the metrics endpoint on ports {port}-{port + attempts - 1}")
+                return None
+            threading.Thread(target=_metrics_server.serve_forever, name="metrics", daemon=True).start()
+            print(f"Serving metrics on http://127.0.0.1:{_metrics_server.server_port}/metrics")
+    return _metrics_server.server_port
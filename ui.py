@@ -1,69 +1,192 @@
+import time
+import asyncio
 import panel as pn
+from langchain_core.callbacks import AsyncCallbackHandler
+from tracing import span, turn, tracing_callbacks
+from llm_scheduler import llm_session
 
-def setup_chat_ui(agent_executor, context):
+
+class StreamingAnswerHandler(AsyncCallbackHandler):
+    """
+    Streams the agent's final answer into the chat as the LLM produces it.
+    Thoughts and tool calls are not shown: text is only passed on once the answer prefix
+    (e.g. 'AI:') has appeared in the current LLM call's output. The names of the tools the
+    agent used are collected in tools_used.
+    """
+
+    def __init__(self, on_text, answer_prefix):
+        self.on_text = on_text
+        self.answer_prefix = answer_prefix
+        self.buffer = ""
+        self.first_token_time = None
+        self.tools_used = []
+
+    async def on_llm_start(self, serialized, prompts, **kwargs):
+        self.buffer = ""
+
+    async def on_tool_start(self, serialized, input_str, **kwargs):
+        self.tools_used.append(serialized.get("name"))
+
+    async def on_llm_new_token(self, token, **kwargs):
+        self.buffer += token
+        start = self.buffer.find(self.answer_prefix)
+        if start == -1:
+            return
+        answer = self.buffer[start + len(self.answer_prefix):].strip()
+        if answer:
+            if self.first_token_time is None:
+                self.first_token_time = time.perf_counter()
+            self.on_text(answer)
+
+
+def setup_chat_ui(agent_executor, context, response_cache=None, router=None):
     """
     Sets up a chatbot UI using Panel with custom HTML/CSS for styling.
     Parameters:
         agent_executor: The agent executor instance for processing user inputs.
         context: A list to maintain the conversation context between the user and the bot.
+        response_cache: Optional SemanticResponseCache answering repeated stateless questions without the agent.
+        router: Optional IntentRouter answering greetings, refusals, totals and order summaries without the agent.
     """
     pn.extension()
 
-    message_display = pn.pane.HTML("<div style='height: 400px; overflow-y: auto;'></div>", height=450, width=800, align='center')
+    # Messages are rendered one bubble per pane, so an update only sends the bubble that changed.
+    # Only the latest history_size bubbles are kept on the page; older ones are paged back in on request.
+    history_size = 50
+    rendered = []      # Cached HTML of every bubble, in context order
+    first_shown = 0    # Index in rendered of the first bubble on the page
+    message_display = pn.Column(height=400, width=800, scroll=True, align='center', css_classes=['chat-container'])
+    earlier_btn = pn.widgets.Button(name="Show earlier messages", button_type="light", visible=False, align="center")
 
     # input box and send button
     inp = pn.widgets.TextInput(name="Your Message", placeholder="Type your message here...", width=300, align="center")
     send_btn = pn.widgets.Button(name="Send", button_type="primary", width=100, align="center")
+    status = pn.pane.Markdown("", align="center")
+    answer_prefix = f"{agent_executor.agent.ai_prefix}:"
 
-    def update_chat_display():
-        """Update the chat display with the conversation history."""
-        chat_contents = []  
-        for msg in context:
-            role = msg['role'].capitalize()
-            content = msg['content']
-            if role == "User":
-                chat_contents.append(
-                    f'<div style="text-align: right;">'
-                    f'<span style="background-color: #DCF8C6; padding: 8px; border-radius: 10px; display: inline-block;">'
-                    f'You: {content}</span></div>'  # User's messages in a green bubble
-                )
-            else:
-                chat_contents.append(
-                    f'<div style="text-align: left;">'
-                    f'<span style="background-color: #E6E6E6; padding: 8px; border-radius: 10px; display: inline-block;">'
-                    f'Bot: {content}</span></div>'  # Bot's responses in a gray bubble
-                )
-        
-        message_display.object = (
-            "<div id='chat-container' style='height: 400px; overflow-y: auto;'>"
-            + "<br>".join(chat_contents)
-            + "</div>"
+    def render_message(msg):
+        """HTML of one chat bubble."""
+        if msg['role'] == "user":
+            return (
+                f'<div style="text-align: right;">'
+                f'<span style="background-color: #DCF8C6; padding: 8px; border-radius: 10px; display: inline-block;">'
+                f'You: {msg["content"]}</span></div>'  # User's messages in a green bubble
+            )
+        return (
+            f'<div style="text-align: left;">'
+            f'<span style="background-color: #E6E6E6; padding: 8px; border-radius: 10px; display: inline-block;">'
+            f'Bot: {msg["content"]}</span></div>'  # Bot's responses in a gray bubble
         )
 
-    def collect_messages(event):
-        """Collect user messages and display bot responses."""
+    def add_message(msg):
+        """Append a message to the conversation and send only its bubble to the browser."""
+        nonlocal first_shown
+        with span("render"):
+            context.append(msg)
+            rendered.append(render_message(msg))
+            message_display.append(pn.pane.HTML(rendered[-1], sizing_mode="stretch_width"))
+            if len(message_display) > history_size:
+                message_display.pop(0)
+                first_shown += 1
+                earlier_btn.visible = True
+
+    def update_last_message():
+        """Re-render the last bubble after its message changed, e.g. while an answer streams in."""
+        with span("render"):
+            rendered[-1] = render_message(context[-1])
+            message_display[-1].object = rendered[-1]
+
+    def show_earlier(event):
+        """Page the previous history_size bubbles back in from the cache."""
+        nonlocal first_shown
+        start = max(0, first_shown - history_size)
+        earlier = [pn.pane.HTML(html, sizing_mode="stretch_width") for html in rendered[start:first_shown]]
+        message_display.objects = earlier + message_display.objects
+        first_shown = start
+        earlier_btn.visible = first_shown > 0
+
+    earlier_btn.on_click(show_earlier)
+
+    async def collect_messages(event):
+        """
+        Collect user messages and display bot responses.
+        Runs on the server's event loop with the agent's async interface, so a slow LLM call
+        never blocks other sessions, and the answer is streamed into the chat as it arrives.
+        """
         user_message = inp.value.strip()
         if not user_message:
             return  # Ignore empty input
-        context.append({"role": "user", "content": user_message})
+        session_context = pn.state.curdoc.session_context if pn.state.curdoc else None
+        session_id = session_context.id if session_context else None
+        llm_session.set(session_id)   # LLM requests of this turn queue under the session
+        with turn(session_id):
+            await respond(user_message)
+
+    async def respond(user_message):
+        """Answer one user message: locally, from the cache, or with the agent."""
+        add_message({"role": "user", "content": user_message})
         inp.value = ""  # Clear input field
-        update_chat_display()
+        reply = {"role": "assistant", "content": "..."}
+        add_message(reply)
+
+        def show_partial(text):
+            reply["content"] = text
+            update_last_message()
+
+        def answer_locally(answer, source):
+            reply["content"] = answer
+            update_last_message()
+            agent_executor.memory.save_context({"input": user_message}, {"output": answer})
+            status.object = f"Answered {source} in {time.perf_counter() - start_time:.2f}s"
+
+        handler = StreamingAnswerHandler(show_partial, answer_prefix)
+        start_time = time.perf_counter()
 
+        # Simple intents are answered without the LLM
+        with span("route"):
+            routed = await asyncio.to_thread(router.route, user_message) if router else None
+        if routed is not None:
+            answer_locally(routed, "locally")
+            return
+
+        # Repeated stateless questions are answered from the semantic cache
+        with span("response_cache"):
+            cached = await asyncio.to_thread(response_cache.lookup, user_message) if response_cache else None
+        if cached is not None:
+            answer_locally(cached, "from cache")
+            return
+
+        status.object = "Thinking..."
+        send_btn.disabled = True
+        answered = False
+        stop_reason = None
         try:
             # Process user input with the agent executor
-            agent_response = agent_executor.invoke({"input": user_message})
+            agent_response = await agent_executor.ainvoke({"input": user_message},
+                                                          config={"callbacks": [handler] + tracing_callbacks()})
             if agent_response and 'output' in agent_response:
                 bot_response = agent_response['output']
+                stop_reason = agent_response.get('stop_reason')
+                answered = stop_reason in (None, "finished")
             else:
                 bot_response = "Sorry, I couldn't process your request."
+        except Exception as e:
+            bot_response = f"An error occurred: {str(e)}"
+        finally:
+            send_btn.disabled = False
 
-            # Append bot response to context
-            context.append({"role": "assistant", "content": bot_response})
-            update_chat_display()
+        reply["content"] = bot_response
+        update_last_message()
 
-        except Exception as e:
-            context.append({"role": "assistant", "content": f"An error occurred: {str(e)}"})
-            update_chat_display()
+        total = time.perf_counter() - start_time
+        if answered and response_cache:
+            await asyncio.to_thread(response_cache.store, user_message, bot_response, total, handler.tools_used)
+        if handler.first_token_time is not None:
+            status.object = f"First token after {handler.first_token_time - start_time:.2f}s, answered in {total:.2f}s"
+        else:
+            status.object = f"Answered in {total:.2f}s"
+        if stop_reason not in (None, "finished"):
+            status.object += f" (stopped early: {stop_reason})"
 
     # Collect_messages function to the send button
     send_btn.on_click(collect_messages)
@@ -72,8 +195,10 @@ def setup_chat_ui(agent_executor, context):
 
     layout = pn.Column(
         title_pane,
+        earlier_btn,
         message_display,
         pn.Row(inp, send_btn, align='center'),
+        status,
         sizing_mode="stretch_width",
         align="center",
     )
@@ -90,11 +215,7 @@ def setup_chat_ui(agent_executor, context):
             width: 100%;
             margin: 0 auto;
         }
-        .panel-html {
-            overflow-y: scroll; 
-            height: 400px;
-        }
-        #chat-container {
+        .chat-container {
             padding: 10px;
         }
         .panel-input {
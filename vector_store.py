@@ -1,10 +1,105 @@
+import os
 from langchain_community.vectorstores import Chroma
-from langchain_community.embeddings import SentenceTransformerEmbeddings
-from config import persist_directory
-
-def initialize_vector_store(documents):
-    embedding = SentenceTransformerEmbeddings(model_name='sentence-transformers/all-MiniLM-L6-v2')
-    chroma = Chroma(embedding_function=embedding, persist_directory=persist_directory)
-    chroma.add_documents(documents)
-    
-    return chroma
+from config import persist_directory, vector_backend, numpy_index_directory
+from embedding_cache import get_embedding_function
+from numpy_store import NumpyVectorStore
+from lexical_index import LexicalIndex, lexical_text
+from catalog import bump_catalog_version
+
+
+def sync_documents(vector_store, documents, batch_size=1024, report=None, lexical_index=None):
+    """
+    Make the vector store contain exactly the given documents.
+    Documents can be any iterable and are consumed lazily: only new or changed products are embedded,
+    in chunks of batch_size with one bulk write per chunk, and products that are gone from the catalog
+    are deleted. Re-running against an unchanged catalog does no embedding work.
+    report, if given, is called as report(rows_seen, rows_added) after every chunk.
+    lexical_index, if given, is updated with the same additions and deletions, and saved if it changed.
+    Nothing is written when the store and the index already match the documents.
+    Returns:
+    tuple: (number of documents added, number of documents deleted)
+    """
+    existing = set(vector_store.get(include=[])['ids'])
+    seen = set()
+    batch_ids, batch_docs = [], []
+    rows = added = 0
+    lexical_changed = False
+
+    def write_batch():
+        nonlocal added
+        if batch_docs:
+            vector_store.add_documents(batch_docs, ids=batch_ids)
+            added += len(batch_docs)
+            batch_ids.clear()
+            batch_docs.clear()
+        if report:
+            report(rows, added)
+
+    for doc in documents:
+        rows += 1
+        doc_id = doc.metadata['product_id']
+        if doc_id in seen:
+            continue
+        seen.add(doc_id)
+        if lexical_index is not None and doc_id not in lexical_index:
+            lexical_index.add(doc_id, lexical_text(doc.page_content))
+            lexical_changed = True
+        if doc_id in existing:
+            continue
+        batch_ids.append(doc_id)
+        batch_docs.append(doc)
+        if len(batch_docs) >= batch_size:
+            write_batch()
+    write_batch()
+
+    stale_ids = list(existing - seen)
+    for i in range(0, len(stale_ids), batch_size):
+        vector_store.delete(ids=stale_ids[i:i + batch_size])
+    if lexical_index is not None:
+        for doc_id in stale_ids:
+            if doc_id in lexical_index:
+                lexical_index.remove(doc_id)
+                lexical_changed = True
+        if lexical_changed:
+            lexical_index.save()
+    if added or stale_ids:
+        vector_store.persist()
+        bump_catalog_version()
+    return added, len(stale_ids)
+
+
+def get_vector_store(read_only=False):
+    """
+    The vector store selected by config.vector_backend: persisted Chroma, or the in-memory NumPy index.
+    read_only memory-maps the NumPy index instead of loading it, so forked workers share its pages.
+    """
+    embedding = get_embedding_function()
+    if vector_backend == 'numpy':
+        return NumpyVectorStore(embedding, persist_directory=numpy_index_directory,
+                                mmap_mode='r' if read_only else None)
+    if vector_backend != 'chroma':
+        raise ValueError(f"Unknown vector backend: {vector_backend!r}")
+    return Chroma(embedding_function=embedding, persist_directory=persist_directory)
+
+
+def index_directory():
+    """Directory of the configured vector store, where the lexical index and catalog snapshot are saved too."""
+    return numpy_index_directory if vector_backend == 'numpy' else persist_directory
+
+
+def get_lexical_index():
+    """The lexical index saved alongside the configured vector store."""
+    return LexicalIndex.load(os.path.join(index_directory(), 'lexical_index.pkl'))
+
+
+def snapshot_path():
+    """Path of the product table snapshot that matches the configured vector store."""
+    return os.path.join(index_directory(), 'product_table.pkl')
+
+
+def initialize_vector_store(documents, lexical_index=None, read_only=False):
+    vector_store = get_vector_store(read_only=read_only)
+    added, deleted = sync_documents(vector_store, documents, lexical_index=lexical_index)
+    print(f"Vector store up to date: {added} added, {deleted} removed.")
+
+    return vector_store